@@ -0,0 +1,166 @@
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict
+
+from fastapi import HTTPException, Request
+
+from app.core.config import get_settings
+from app.core.lazy import ProcessLocal
+
+
+class AdmissionController:
+    """
+    Concurrency budget with a bounded, per-client fair wait queue.
+
+    At most `max_concurrent` requests run at once. Up to `max_queue` more may
+    wait for a slot; freed slots are handed to waiting clients round-robin so
+    one client's batch cannot starve everyone else. Each client may hold at
+    most `per_client_limit` running or queued requests. Anything beyond that
+    (or waiting longer than `max_wait`) is rejected straight away with a 503.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        max_concurrent: int,
+        max_queue: int,
+        max_wait: float,
+        per_client_limit: int,
+        retry_after: int,
+    ):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.per_client_limit = per_client_limit
+        self.retry_after = retry_after
+
+        self._in_flight = 0
+        self._queued = 0
+        self._per_client: Dict[str, int] = {}
+        self._waiters: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+
+    def _reject(self, reason: str) -> HTTPException:
+        return HTTPException(
+            status_code=503,
+            detail=f"{self.name} is overloaded: {reason}",
+            headers={"Retry-After": str(self.retry_after)},
+        )
+
+    async def acquire(self, client: str) -> None:
+        if self._per_client.get(client, 0) >= self.per_client_limit:
+            raise self._reject("too many concurrent requests from this client")
+
+        if self._in_flight < self.max_concurrent and not self._queued:
+            self._in_flight += 1
+            self._per_client[client] = self._per_client.get(client, 0) + 1
+            return
+
+        if self._queued >= self.max_queue:
+            raise self._reject("wait queue is full")
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(client, deque()).append(future)
+        self._queued += 1
+        self._per_client[client] = self._per_client.get(client, 0) + 1
+
+        try:
+            await asyncio.wait_for(future, self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we gave up; pass it on.
+                self.release(client)
+            else:
+                self._drop_waiter(client, future)
+            if isinstance(exc, asyncio.TimeoutError):
+                raise self._reject("timed out waiting for a slot")
+            raise
+
+    def release(self, client: str) -> None:
+        self._decrement_client(client)
+
+        # Hand the slot to the next client in round-robin order.
+        while self._waiters:
+            next_client, queue = self._waiters.popitem(last=False)
+            future = queue.popleft()
+            if queue:
+                self._waiters[next_client] = queue
+            self._queued -= 1
+            if not future.done():
+                future.set_result(None)
+                return
+
+        self._in_flight -= 1
+
+    def _drop_waiter(self, client: str, future: asyncio.Future) -> None:
+        queue = self._waiters.get(client)
+        if queue is not None and future in queue:
+            queue.remove(future)
+            self._queued -= 1
+            if not queue:
+                del self._waiters[client]
+        self._decrement_client(client)
+
+    def _decrement_client(self, client: str) -> None:
+        remaining = self._per_client.get(client, 0) - 1
+        if remaining > 0:
+            self._per_client[client] = remaining
+        else:
+            self._per_client.pop(client, None)
+
+    @asynccontextmanager
+    async def slot(self, client: str) -> AsyncIterator[None]:
+        await self.acquire(client)
+        try:
+            yield
+        finally:
+            self.release(client)
+
+
+def _build_controllers() -> Dict[str, AdmissionController]:
+    settings = get_settings()
+    budgets = {
+        "generate": settings.ADMISSION_GENERATE_CONCURRENCY,
+        "add_asset": settings.ADMISSION_ADD_ASSET_CONCURRENCY,
+        "scrape": settings.ADMISSION_SCRAPE_CONCURRENCY,
+        "create_session": settings.ADMISSION_CREATE_SESSION_CONCURRENCY,
+    }
+    return {
+        name: AdmissionController(
+            name,
+            max_concurrent=concurrency,
+            max_queue=concurrency * settings.ADMISSION_QUEUE_FACTOR,
+            max_wait=settings.ADMISSION_MAX_WAIT_SECONDS,
+            per_client_limit=settings.ADMISSION_PER_CLIENT_LIMIT,
+            retry_after=settings.ADMISSION_RETRY_AFTER_SECONDS,
+        )
+        for name, concurrency in budgets.items()
+    }
+
+
+_controllers = ProcessLocal("admission_controllers", _build_controllers)
+
+
+def client_key(request: Request) -> str:
+    """Identify the caller for fairness: explicit client id, else peer address."""
+    client_id = request.headers.get("x-client-id")
+    if client_id:
+        return client_id
+    return request.client.host if request.client else "anonymous"
+
+
+def admission_slot(name: str, request: Request):
+    """Async context manager holding a slot of the `name` budget."""
+    return _controllers.get()[name].slot(client_key(request))
+
+
+def admit(name: str):
+    """FastAPI dependency that holds a slot of the `name` budget for the request."""
+
+    async def dependency(request: Request):
+        async with admission_slot(name, request):
+            yield
+
+    return dependency
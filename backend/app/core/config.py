@@ -1,16 +1,90 @@
+from functools import lru_cache
+from typing import Optional
+
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
-    BFL_API_KEY: str
+    # Secrets are optional at load time so a missing key only disables the
+    # service that needs it instead of failing the whole application.
+    BFL_API_KEY: Optional[str] = None
     FLUX_API_URL: str = "https://api.bfl.ai/v1/flux-kontext-pro"
-    
-    SUPABASE_URL: str
-    SUPABASE_KEY: str
 
-    APIFY_CLIENT_TOKEN: str
+    SUPABASE_URL: Optional[str] = None
+    SUPABASE_KEY: Optional[str] = None
+
+    APIFY_CLIENT_TOKEN: Optional[str] = None
     APIFY_ACTOR_ID: str = "nMiNd0glV6oqKv78Y"
 
+    # Durable journal of in-flight Flux generations (see generation_journal.py)
+    GENERATION_JOURNAL_PATH: str = "generation_journal.sqlite3"
+    GENERATION_LEASE_SECONDS: float = 30.0
+    GENERATION_RECOVERY_INTERVAL: float = 15.0
+    GENERATION_MAX_ATTEMPTS: int = 3
+
+    # Admission control for expensive endpoints (see admission.py)
+    ADMISSION_GENERATE_CONCURRENCY: int = 8
+    ADMISSION_ADD_ASSET_CONCURRENCY: int = 8
+    ADMISSION_SCRAPE_CONCURRENCY: int = 2
+    ADMISSION_CREATE_SESSION_CONCURRENCY: int = 2
+    ADMISSION_QUEUE_FACTOR: int = 2
+    ADMISSION_MAX_WAIT_SECONDS: float = 10.0
+    ADMISSION_PER_CLIENT_LIMIT: int = 4
+    ADMISSION_RETRY_AFTER_SECONDS: int = 5
+
+    # Near-duplicate filtering of scraped listing photos (see image_dedup.py);
+    # threshold is the max Hamming distance between 64-bit perceptual hashes
+    SCRAPE_DEDUP_ENABLED: bool = True
+    SCRAPE_DEDUP_THRESHOLD: int = 8
+    SCRAPE_DEDUP_WORKERS: int = 2
+    SCRAPE_FETCH_CONCURRENCY: int = 8
+
+    # Resilient fetches of CDN/storage objects (see resilient_fetch.py);
+    # set FETCH_HEDGE_PERCENTILE to 0 to disable hedged requests
+    FETCH_ATTEMPTS: int = 3
+    FETCH_ATTEMPT_TIMEOUT: float = 20.0
+    FETCH_BACKOFF_BASE: float = 0.25
+    FETCH_BACKOFF_MAX: float = 4.0
+    FETCH_HEDGE_PERCENTILE: float = 0.95
+    FETCH_HEDGE_MIN_SAMPLES: int = 20
+    FETCH_BREAKER_THRESHOLD: int = 5
+    FETCH_BREAKER_RESET_SECONDS: float = 30.0
+
+    # Direct Postgres connection string used to fan session events out to
+    # every worker (see event_fanout.py); without it events stay per worker
+    EVENTS_DATABASE_URL: Optional[str] = None
+
+    # Concurrent downloads while streaming a session export archive
+    EXPORT_FETCH_WINDOW: int = 4
+
+    # Responses smaller than this are sent uncompressed
+    COMPRESSION_MINIMUM_SIZE: int = 1024
+
+    # Structured logging (see logs.py); repeated warnings/errors are limited
+    # to LOG_ERROR_BURST per window, and sampled debug lines (e.g. per-poll)
+    # are kept at LOG_SAMPLE_RATE
+    LOG_LEVEL: str = "INFO"
+    LOG_JSON: bool = True
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_ERROR_BURST: int = 5
+    LOG_ERROR_WINDOW_SECONDS: float = 60.0
+    LOG_SAMPLE_RATE: float = 0.1
+    # Per-logger levels as "name=LEVEL,..."; HTTP clients otherwise log one
+    # INFO line per request (every Flux poll and Supabase call)
+    LOG_LOGGER_LEVELS: str = "httpx=WARNING,httpcore=WARNING,hpack=WARNING"
+
     class Config:
         env_file = ".env"
 
-settings = Settings()
+
+def require_setting(settings: Settings, name: str) -> str:
+    """Return a required setting or raise if it is not configured."""
+    value = getattr(settings, name)
+    if not value:
+        raise RuntimeError(f"{name} is not configured")
+    return value
+
+
+@lru_cache
+def get_settings() -> Settings:
+    """Load settings on first use instead of at import time."""
+    return Settings()
@@ -0,0 +1,40 @@
+import hashlib
+import json
+from typing import Any
+
+from fastapi import Request, Response
+
+
+def version_etag(*parts: Any) -> str:
+    """
+    Build a weak ETag from version data (ids and row update times).
+
+    Weak because the same representation may be served with different
+    content encodings.
+    """
+    raw = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+    digest = hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Weak comparison of `etag` against the request's If-None-Match header."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == opaque
+        for candidate in header.split(",")
+    )
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag))
+
+
+def cache_headers(etag: str) -> dict:
+    # no-cache: clients may store the body but must revalidate with the ETag.
+    return {"ETag": etag, "Cache-Control": "no-cache"}
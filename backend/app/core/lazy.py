@@ -0,0 +1,59 @@
+import os
+import threading
+from typing import Callable, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class ServiceUnavailableError(RuntimeError):
+    """Raised when a service cannot be constructed (e.g. missing settings)."""
+
+    def __init__(self, name: str, reason: str):
+        super().__init__(f"{name} is unavailable: {reason}")
+        self.name = name
+        self.reason = reason
+
+
+class ProcessLocal(Generic[T]):
+    """
+    Lazily builds one instance per process.
+
+    The instance is rebuilt when the current pid differs from the pid that
+    created it, so clients holding sockets are never shared across a fork
+    (e.g. uvicorn/gunicorn workers forked from a preloaded master).
+    """
+
+    def __init__(self, name: str, factory: Callable[[], T]):
+        self.name = name
+        self._factory = factory
+        self._instance: Optional[T] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> T:
+        pid = os.getpid()
+        instance = self._instance
+        if instance is not None and self._pid == pid:
+            return instance
+
+        with self._lock:
+            if self._instance is None or self._pid != pid:
+                try:
+                    self._instance = self._factory()
+                except ServiceUnavailableError:
+                    raise
+                except Exception as exc:
+                    raise ServiceUnavailableError(self.name, str(exc)) from exc
+                self._pid = pid
+            return self._instance
+
+    def peek(self) -> Optional[T]:
+        """Return the instance for this process if it has been built."""
+        if self._pid != os.getpid():
+            return None
+        return self._instance
+
+    def reset(self) -> None:
+        with self._lock:
+            self._instance = None
+            self._pid = None
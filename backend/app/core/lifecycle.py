@@ -0,0 +1,124 @@
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from app.core.config import get_settings
+from app.core.lazy import ServiceUnavailableError
+from app.core.resilient_fetch import _resilient_fetcher
+from app.services.event_fanout import _event_fanout
+from app.services.flux_service import _flux_service
+from app.services.generation_journal import _generation_journal
+from app.services.generation_service import _generation_service
+from app.services.image_dedup import _image_deduplicator
+from app.services.scrape_service import _scrape_service
+from app.services.supabase_service import _supabase_service
+
+logger = logging.getLogger(__name__)
+
+# Every route needs storage; the other services only disable their own routes.
+CORE_SERVICES = ("supabase_service",)
+
+
+class Readiness:
+    """Tracks whether this worker finished warming up its services."""
+
+    def __init__(self):
+        self.warmed = False
+        self.errors: Dict[str, str] = {}
+        # Services that are usable but whose connections could not be opened.
+        self.cold: Dict[str, str] = {}
+        self.recovery_task: Optional[asyncio.Task] = None
+        self.fanout_task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.warmed and not any(name in self.errors for name in CORE_SERVICES)
+
+    def snapshot(self) -> Dict[str, object]:
+        return {"ready": self.ready, "unavailable": dict(self.errors), "cold": dict(self.cold)}
+
+
+readiness = Readiness()
+
+
+async def warmup_services() -> None:
+    """
+    Build this worker's clients and open their connections before it accepts
+    traffic.
+
+    A service that cannot be built (e.g. a missing secret) is recorded instead
+    of aborting startup, so routes that do not depend on it keep working.
+    """
+    readiness.warmed = False
+    readiness.errors.clear()
+    readiness.cold.clear()
+
+    for holder in (
+        _supabase_service,
+        _scrape_service,
+        _flux_service,
+        _generation_journal,
+        _generation_service,
+    ):
+        try:
+            holder.get()
+        except ServiceUnavailableError as exc:
+            readiness.errors[holder.name] = exc.reason
+
+    # Open connections now so the first requests skip the TCP/TLS setup. A
+    # failure here is not fatal: the pools connect on first use instead.
+    warmups = {}
+    supabase = _supabase_service.peek()
+    if supabase is not None:
+        warmups[_supabase_service.name] = asyncio.to_thread(supabase.warmup)
+    flux = _flux_service.peek()
+    if flux is not None:
+        warmups[_flux_service.name] = flux.warmup()
+    results = await asyncio.gather(*warmups.values(), return_exceptions=True)
+    for name, result in zip(warmups, results):
+        if isinstance(result, Exception):
+            readiness.cold[name] = str(result)
+            logger.warning("Could not open connections for %s", name, exc_info=result)
+
+    # Resume generations journaled by workers that died mid-flight.
+    generation = _generation_service.peek()
+    if generation is not None:
+        readiness.recovery_task = asyncio.create_task(generation.recover_forever())
+
+    # Share session events with the other workers.
+    if get_settings().EVENTS_DATABASE_URL:
+        try:
+            readiness.fanout_task = asyncio.create_task(_event_fanout.get().run_forever())
+        except ServiceUnavailableError as exc:
+            readiness.errors[_event_fanout.name] = exc.reason
+    else:
+        logger.info("EVENTS_DATABASE_URL is not set; session events stay within this worker")
+
+    readiness.warmed = True
+
+
+async def shutdown_services() -> None:
+    readiness.warmed = False
+    if readiness.recovery_task is not None:
+        readiness.recovery_task.cancel()
+        readiness.recovery_task = None
+    if readiness.fanout_task is not None:
+        readiness.fanout_task.cancel()
+        readiness.fanout_task = None
+
+    deduplicator = _image_deduplicator.peek()
+    if deduplicator is not None:
+        deduplicator.shutdown()
+
+    journal = _generation_journal.peek()
+    if journal is not None:
+        journal.close()
+
+    flux = _flux_service.peek()
+    if flux is not None:
+        await flux.aclose()
+
+    fetcher = _resilient_fetcher.peek()
+    if fetcher is not None:
+        await fetcher.aclose()
+
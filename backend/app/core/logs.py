@@ -0,0 +1,245 @@
+import json
+import logging
+import queue
+import random
+import sys
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Iterator, Optional, Tuple
+from uuid import uuid4
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import Settings
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+job_id_var: ContextVar[Optional[str]] = ContextVar("job_id", default=None)
+
+REQUEST_ID_HEADER = "x-request-id"
+
+# Attributes every LogRecord has; anything else was passed through `extra`.
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+@contextmanager
+def bind_job(job_id: str) -> Iterator[None]:
+    """Attach `job_id` to every record logged in this context."""
+    token = job_id_var.set(job_id)
+    try:
+        yield
+    finally:
+        job_id_var.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """
+    Copies the request/job ids onto the record.
+
+    Handler filters run on the thread that logs the record, which is why the
+    context variables are visible here. Keep this filter on the queue
+    handler; on the listener thread the ids would always be empty.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        if getattr(record, "job_id", None) is None:
+            record.job_id = job_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a `rate` fraction of records logged with `extra={"sampled": True}`."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "sampled", False):
+            return True
+        return random.random() < self.rate
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets at most `burst` identical records through per `window` seconds.
+
+    Records are identical when they share logger, level, message template and
+    exception type, so log with %-style arguments rather than f-strings. The
+    first record of the next window carries the number that were dropped.
+    """
+
+    def __init__(self, burst: int, window: float, level: int = logging.WARNING, max_keys: int = 1024):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.level = level
+        self.max_keys = max_keys
+        self._windows: "OrderedDict[Tuple[Any, ...], list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < self.level or self.burst <= 0:
+            return True
+        exc_type = record.exc_info[0].__name__ if record.exc_info and record.exc_info[0] else None
+        key = (record.name, record.levelno, str(record.msg), exc_type)
+        now = time.monotonic()
+        with self._lock:
+            state = self._windows.get(key)
+            if state is None or now - state[0] >= self.window:
+                if state is not None and state[2]:
+                    record.suppressed = state[2]
+                state = self._windows[key] = [now, 0, 0]
+                while len(self._windows) > self.max_keys:
+                    self._windows.popitem(last=False)
+            else:
+                self._windows.move_to_end(key)
+            state[1] += 1
+            if state[1] > self.burst:
+                state[2] += 1
+                return False
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including ids and `extra` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and value is not None and key != "sampled":
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread without blocking the caller.
+
+    Only the message and traceback are rendered here (they may reference
+    objects that change later); JSON encoding and the write happen on the
+    listener thread. When the queue is full records are dropped and counted.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = "".join(traceback.format_exception(*record.exc_info)).rstrip()
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.dropped:
+            record.dropped_records = self.dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+        else:
+            self.dropped = 0
+
+
+_listener: Optional[QueueListener] = None
+
+
+def configure_logging(settings: Settings) -> None:
+    """
+    Route this worker's logging through a queue drained by a background thread.
+
+    Request handlers only pay for filtering and one `put_nowait`; formatting
+    and writing to the sink never run on the event loop.
+    """
+    global _listener
+    shutdown_logging()
+
+    log_queue: queue.Queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    handler = _NonBlockingQueueHandler(log_queue)
+    handler.addFilter(ContextFilter())
+    handler.addFilter(SamplingFilter(settings.LOG_SAMPLE_RATE))
+    handler.addFilter(RateLimitFilter(settings.LOG_ERROR_BURST, settings.LOG_ERROR_WINDOW_SECONDS))
+
+    sink = logging.StreamHandler(sys.stdout)
+    if settings.LOG_JSON:
+        sink.setFormatter(JsonFormatter())
+    else:
+        sink.setFormatter(
+            logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s %(job_id)s] %(message)s")
+        )
+
+    root = logging.getLogger()
+    for existing in [h for h in root.handlers if isinstance(h, _NonBlockingQueueHandler)]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(settings.LOG_LEVEL.upper())
+    for name, level in parse_logger_levels(settings.LOG_LOGGER_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = QueueListener(log_queue, sink, respect_handler_level=True)
+    _listener.start()
+
+
+def parse_logger_levels(spec: str) -> Dict[str, str]:
+    """Parse "httpx=WARNING,app.services=DEBUG" into {logger: level}."""
+    levels = {}
+    for item in spec.split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class RequestContextMiddleware:
+    """Binds an `X-Request-Id` (taken from the request or generated) to the request's logs."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers") or []:
+            if name == REQUEST_ID_HEADER.encode():
+                request_id = value.decode("latin-1")[:128]
+                break
+        request_id = request_id or uuid4().hex
+
+        async def send_with_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)[REQUEST_ID_HEADER] = request_id
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(token)
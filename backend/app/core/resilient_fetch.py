@@ -0,0 +1,262 @@
+import asyncio
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Optional
+from urllib.parse import urlparse
+
+import httpx
+
+from app.core.config import Settings, get_settings
+from app.core.lazy import ProcessLocal
+
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+class FetchError(RuntimeError):
+    """A fetch failed after exhausting its retries."""
+
+    def __init__(self, url: str, reason: str, retry_after: Optional[float] = None):
+        super().__init__(f"Failed to fetch {url}: {reason}")
+        self.url = url
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(FetchError):
+    """The host's circuit breaker is open; the request was not attempted."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker for one host.
+
+    After `threshold` consecutive failures the circuit opens and calls fail
+    fast for `reset_timeout` seconds. Then a single probe is let through
+    (half-open): success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_started: Optional[float] = None
+
+    def retry_after(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if self.retry_after() > 0:
+            return False
+        now = time.monotonic()
+        # A probe that never reported back (e.g. cancelled) does not keep the
+        # circuit half-open forever.
+        if self._probe_started is not None and now - self._probe_started < self.reset_timeout:
+            return False
+        self._probe_started = now
+        return True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probe_started = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probe_started = None
+        if self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Rolling window of successful request latencies for one host."""
+
+    def __init__(self, size: int = 200):
+        self.samples: Deque[float] = deque(maxlen=size)
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, fraction: float, min_samples: int) -> Optional[float]:
+        if len(self.samples) < min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class ResilientFetcher:
+    """
+    GET with per-attempt timeouts, jittered retries, hedging and breakers.
+
+    Transient failures (network errors, timeouts, 408/429/5xx) are retried
+    with exponential backoff. Once a host has enough latency samples, an
+    attempt that is still pending at the configured percentile gets a hedged
+    second request, and the first response wins. A per-host circuit breaker
+    stops hammering a host that keeps failing.
+    """
+
+    def __init__(self, settings: Settings):
+        self.attempts = settings.FETCH_ATTEMPTS
+        self.attempt_timeout = settings.FETCH_ATTEMPT_TIMEOUT
+        self.backoff_base = settings.FETCH_BACKOFF_BASE
+        self.backoff_max = settings.FETCH_BACKOFF_MAX
+        self.hedge_percentile = settings.FETCH_HEDGE_PERCENTILE
+        self.hedge_min_samples = settings.FETCH_HEDGE_MIN_SAMPLES
+        self.breaker_threshold = settings.FETCH_BREAKER_THRESHOLD
+        self.breaker_reset = settings.FETCH_BREAKER_RESET_SECONDS
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latencies: Dict[str, LatencyTracker] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.attempt_timeout,
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _breaker(self, host: str) -> CircuitBreaker:
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            breaker = self._breakers[host] = CircuitBreaker(self.breaker_threshold, self.breaker_reset)
+        return breaker
+
+    def _latency(self, host: str) -> LatencyTracker:
+        tracker = self._latencies.get(host)
+        if tracker is None:
+            tracker = self._latencies[host] = LatencyTracker()
+        return tracker
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _check_breaker(self, url: str, host: str) -> CircuitBreaker:
+        breaker = self._breaker(host)
+        if not breaker.allow():
+            raise CircuitOpenError(url, f"circuit open for {host}", retry_after=breaker.retry_after())
+        return breaker
+
+    async def _attempt(self, url: str, host: str) -> httpx.Response:
+        started = time.monotonic()
+        # httpx timeouts apply per phase; this bounds the whole attempt,
+        # including a body that trickles in.
+        response = await asyncio.wait_for(
+            self.client.get(url, timeout=self.attempt_timeout), self.attempt_timeout
+        )
+        if response.status_code in RETRYABLE_STATUS:
+            raise httpx.HTTPStatusError(
+                f"retryable status {response.status_code}", request=response.request, response=response
+            )
+        self._latency(host).record(time.monotonic() - started)
+        return response
+
+    async def _hedged_attempt(self, url: str, host: str) -> httpx.Response:
+        delay = None
+        if self.hedge_percentile:
+            delay = self._latency(host).percentile(self.hedge_percentile, self.hedge_min_samples)
+        if delay is None:
+            return await self._attempt(url, host)
+
+        pending = {asyncio.create_task(self._attempt(url, host))}
+        error: Optional[BaseException] = None
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                # Slower than the host's usual tail: race a second request.
+                pending.add(asyncio.create_task(self._attempt(url, host)))
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def get(self, url: str) -> httpx.Response:
+        """Fetch `url` fully; raises FetchError (or CircuitOpenError) on failure."""
+        host = urlparse(url).netloc
+        last_error = "no attempts made"
+        for attempt in range(self.attempts):
+            breaker = self._check_breaker(url, host)
+            try:
+                response = await self._hedged_attempt(url, host)
+            except httpx.HTTPStatusError as exc:
+                breaker.record_failure()
+                last_error = f"HTTP {exc.response.status_code}"
+            except (httpx.TransportError, asyncio.TimeoutError) as exc:
+                breaker.record_failure()
+                last_error = f"{type(exc).__name__}: {exc}"
+            else:
+                breaker.record_success()
+                if response.is_error:
+                    # Non-retryable client error (e.g. 404): fail without retrying.
+                    raise FetchError(url, f"HTTP {response.status_code}")
+                return response
+
+            if attempt + 1 < self.attempts:
+                await asyncio.sleep(self._backoff(attempt))
+        raise FetchError(url, last_error)
+
+    @asynccontextmanager
+    async def stream(self, url: str) -> AsyncIterator[httpx.Response]:
+        """
+        Open a streamed GET, retrying until response headers arrive.
+
+        Failures after the body started streaming are not retried; the caller
+        has already consumed part of it. The attempt timeout bounds the time
+        until the headers arrive. After that only httpx's per-read timeout
+        applies, so a stalled body still fails but time the caller spends not
+        reading (e.g. behind a slow client) is never counted.
+        """
+        host = urlparse(url).netloc
+        last_error = "no attempts made"
+        for attempt in range(self.attempts):
+            breaker = self._check_breaker(url, host)
+            request = self.client.build_request("GET", url, timeout=self.attempt_timeout)
+            try:
+                async with asyncio.timeout(self.attempt_timeout):
+                    response = await self.client.send(request, stream=True)
+            except (httpx.TransportError, asyncio.TimeoutError) as exc:
+                breaker.record_failure()
+                last_error = f"{type(exc).__name__}: {exc}"
+            else:
+                if response.status_code in RETRYABLE_STATUS:
+                    await response.aclose()
+                    breaker.record_failure()
+                    last_error = f"HTTP {response.status_code}"
+                else:
+                    breaker.record_success()
+                    try:
+                        if response.is_error:
+                            raise FetchError(url, f"HTTP {response.status_code}")
+                        yield response
+                    finally:
+                        await response.aclose()
+                    return
+
+            if attempt + 1 < self.attempts:
+                await asyncio.sleep(self._backoff(attempt))
+        raise FetchError(url, last_error)
+
+
+_resilient_fetcher = ProcessLocal("resilient_fetcher", lambda: ResilientFetcher(get_settings()))
+
+
+def get_resilient_fetcher() -> ResilientFetcher:
+    return _resilient_fetcher.get()
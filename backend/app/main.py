@@ -1,19 +1,42 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import images, sessions
+from fastapi.responses import JSONResponse
+from app.core.compression import CompressionMiddleware
+from app.core.config import get_settings
+from app.core.lazy import ServiceUnavailableError
+from app.core.lifecycle import shutdown_services, warmup_services
+from app.core.logs import RequestContextMiddleware, configure_logging, shutdown_logging
+from app.routers import health, images, sessions
 from dotenv import load_dotenv
 import os
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI(title="Deckd Flux API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs once per worker process, after any fork, before traffic is accepted.
+    configure_logging(get_settings())
+    await warmup_services()
+    yield
+    await shutdown_services()
+    shutdown_logging()
+
+
+app = FastAPI(title="Deckd Flux API", lifespan=lifespan)
 
 origins = [
     "http://localhost:5173",
     "http://127.0.0.1:5173",
 ]
 
+app.add_middleware(CompressionMiddleware)
+
+app.add_middleware(RequestContextMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -22,7 +45,14 @@ app.add_middleware(
     allow_headers=["*"],                # Allow all headers
 )
 
+
+@app.exception_handler(ServiceUnavailableError)
+async def service_unavailable_handler(request: Request, exc: ServiceUnavailableError):
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
+
+
 # Include routers
+app.include_router(health.router, tags=["health"])
 app.include_router(images.router, prefix="/api/v1/images", tags=["images"])
 app.include_router(sessions.router, prefix="/api/v1", tags=["sessions"])
 
@@ -0,0 +1,19 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.core.lifecycle import readiness
+
+router = APIRouter()
+
+
+@router.get("/healthz")
+async def liveness():
+    """Liveness probe: the process is up and serving its event loop."""
+    return {"status": "ok"}
+
+
+@router.get("/readyz")
+async def readiness_probe():
+    """Readiness probe: services are warmed and storage is configured."""
+    status_code = 200 if readiness.ready else 503
+    return JSONResponse(status_code=status_code, content=readiness.snapshot())
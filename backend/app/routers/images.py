@@ -1,12 +1,20 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from app.services.flux_service import flux_service
-from app.services.supabase_service import supabase_service
-from app.services.scrape_service import scrape_service
-from app.services.image_store import upload_remote_image
-from pydantic import BaseModel
-from typing import Optional
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
+from app.core.admission import admit
+from app.services.flux_service import FluxService, get_flux_service
+from app.services.generation_service import GenerationService, get_generation_service
+from app.services.supabase_service import SupabaseService, get_supabase_service
+from app.services.scrape_service import ScrapeService, get_scrape_service
+from app.services.image_dedup import ImageDeduplicator, get_image_deduplicator
+from app.services.image_store import store_image_bytes
+from app.services import session_events
+from app.services.session_events import publish_view_event
+from postgrest.exceptions import APIError
+from pydantic import BaseModel, Field
+from typing import List, Optional
+import logging
 import uuid
-import httpx
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -17,14 +25,36 @@ class GenerateRequest(BaseModel):
     view_id: str
 
 
-class RevertRequest(BaseModel):
+class PipelineStep(BaseModel):
+    prompt: str
+    asset_url: Optional[str] = None
+    asset_name: Optional[str] = None
+    checkpoint: bool = False
+
+
+class PipelineRequest(BaseModel):
+    view_id: str
+    input_image: str
+    steps: List[PipelineStep] = Field(..., min_length=1, max_length=10)
+
+
+class EditRequest(BaseModel):
     view_id: str
 
+
+class CheckoutRequest(BaseModel):
+    view_id: str
+    index: int = Field(..., ge=-1)
+
 class ListingUrl(BaseModel):
     url: str
 
-@router.post("/generate")
-async def update_image(request: GenerateRequest):
+@router.post("/generate", dependencies=[Depends(admit("generate"))])
+async def update_image(
+    request: GenerateRequest,
+    flux_service: FluxService = Depends(get_flux_service),
+    generation_service: GenerationService = Depends(get_generation_service),
+):
     """Updates an image via the Flux API and stores the result in Supabase."""
     try:
         initial_response = await flux_service.update_image(
@@ -32,67 +62,126 @@ async def update_image(request: GenerateRequest):
             input_image=request.input_image,
             input_image_2=request.input_image_2,
         )
-        polling_url = initial_response.get("polling_url")
-        
-        if not polling_url:
-            raise HTTPException(status_code=500, detail="No polling URL received from Flux API")
 
-        # 2. Poll for the result
-        image_url = await flux_service.poll_result(polling_url)
-        
-        # 3. Download the image
-        async with httpx.AsyncClient() as client:
-            image_response = await client.get(image_url)
-            image_response.raise_for_status()
-            image_data = image_response.content
-            
-        # 4. Upload to Supabase
-        content_type = image_response.headers.get("content-type", "image/jpeg")
-        extension = "jpg" if "jpeg" in content_type else "png"
-        file_name = f"{uuid.uuid4()}.{extension}"
-        
-        stored_path = supabase_service.upload_image(
-            image_data, file_name, content_type=content_type, folder="generated"
+        # Poll, download, store and attach the result; every stage is journaled
+        # so a restart mid-generation resumes instead of losing the result.
+        result = await generation_service.run(
+            kind="generate",
+            view_id=request.view_id,
+            initial_response=initial_response,
         )
-        public_url = supabase_service.get_public_url(stored_path)
 
-        edited_images = supabase_service.append_edited_image(request.view_id, public_url)
-        
-        return {
-            "status": "success",
-            "data": {
-                "url": public_url,
-                "original_url": image_url,
-                "view_id": request.view_id,
-                "edited_images": edited_images,
-            },
-        }
+        return {"status": "success", "data": result}
+    except HTTPException:
+        raise
     except Exception as e:
-        import traceback
-        print(f"Error during generation: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error during generation", extra={"kind": "generate", "view_id": request.view_id})
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/revert")
-async def revert_latest_image(request: RevertRequest):
-    """Removes the most recent edited image for a view."""
+@router.post("/pipeline", dependencies=[Depends(admit("generate"))])
+async def run_pipeline(
+    request: PipelineRequest,
+    generation_service: GenerationService = Depends(get_generation_service),
+):
+    """
+    Applies an ordered list of edits to a view in one request.
+
+    Intermediate results go straight from one Flux task to the next; only the
+    final image and steps marked `checkpoint` are stored and added to the view.
+    """
     try:
-        edited_images = supabase_service.remove_latest_edited_image(request.view_id)
-        chat_history = supabase_service.remove_latest_chat_entry(request.view_id)
-        return {
-            "status": "success",
-            "data": {
-                "view_id": request.view_id,
-                "edited_images": edited_images,
-                "chat_history": chat_history,
-            },
-        }
+        result = await generation_service.run_pipeline(
+            view_id=request.view_id,
+            input_image=request.input_image,
+            steps=[step.model_dump() for step in request.steps],
+        )
+        return {"status": "success", "data": result}
+    except HTTPException:
+        raise
     except Exception as e:
+        logger.exception("Error during pipeline generation", extra={"kind": "pipeline", "view_id": request.view_id})
         raise HTTPException(status_code=500, detail=str(e))
 
+
+def _edit_state(view: dict) -> dict:
+    history = view.get("edit_history") or []
+    return {
+        "view_id": view.get("id"),
+        "edited_images": view.get("edited_images") or [],
+        "edit_head": view.get("edit_head", -1),
+        "edit_history": history,
+        "can_undo": view.get("edit_head", -1) >= 0,
+        "can_redo": bool(view.get("edit_redo")),
+        "chat_history": view.get("chat_history") or [],
+    }
+
+
+def _move_head(view_id: str, action: str, move) -> dict:
+    try:
+        view = move()
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except APIError as e:
+        status_code = 400 if e.code == "22023" else 404 if e.code == "P0002" else 500
+        raise HTTPException(status_code=status_code, detail=e.message)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    state = _edit_state(view)
+    publish_view_event(
+        view_id,
+        session_events.EDIT_HEAD_MOVED,
+        {
+            "action": action,
+            "edit_head": state["edit_head"],
+            "edited_images": state["edited_images"],
+        },
+    )
+    return {"status": "success", "data": state}
+
+
+@router.post("/undo")
+@router.post("/revert")
+async def undo_edit(
+    request: EditRequest,
+    supabase_service: SupabaseService = Depends(get_supabase_service),
+):
+    """
+    Steps the view back to the previous edit.
+
+    The undone image stays in the edit history, so a redo restores it without
+    a new generation.
+    """
+    return _move_head(request.view_id, "undo", lambda: supabase_service.undo_edit(request.view_id))
+
+
+@router.post("/redo")
+async def redo_edit(
+    request: EditRequest,
+    supabase_service: SupabaseService = Depends(get_supabase_service),
+):
+    """Re-applies the most recently undone edit."""
+    return _move_head(request.view_id, "redo", lambda: supabase_service.redo_edit(request.view_id))
+
+
+@router.post("/checkout")
+async def checkout_edit(
+    request: CheckoutRequest,
+    supabase_service: SupabaseService = Depends(get_supabase_service),
+):
+    """Moves the view to any earlier edit (-1 = original); new edits branch from it."""
+    return _move_head(
+        request.view_id,
+        "checkout",
+        lambda: supabase_service.checkout_edit(request.view_id, request.index),
+    )
+
 @router.post("/upload")
-async def upload_image(file: UploadFile = File(...)):
+async def upload_image(
+    file: UploadFile = File(...),
+    supabase_service: SupabaseService = Depends(get_supabase_service),
+):
     """
     Uploads an image directly to Supabase.
     """
@@ -117,7 +206,7 @@ async def upload_image(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/images")
-async def list_images():
+async def list_images(supabase_service: SupabaseService = Depends(get_supabase_service)):
     """
     List images from Supabase storage.
     """
@@ -127,8 +216,12 @@ async def list_images():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/scrape")
-async def scrape_listing(listing: ListingUrl):
+@router.post("/scrape", dependencies=[Depends(admit("scrape"))])
+async def scrape_listing(
+    listing: ListingUrl,
+    scrape_service: ScrapeService = Depends(get_scrape_service),
+    deduplicator: ImageDeduplicator = Depends(get_image_deduplicator),
+):
     """
     Scrapes an image from a given listing URL and uploads it to Supabase.
     """
@@ -142,13 +235,18 @@ async def scrape_listing(listing: ListingUrl):
         if not image_urls:
             raise HTTPException(status_code=404, detail="No images returned from listing")
 
+        # Listings repeat shots at different crops/resolutions; keep one each.
+        images = await deduplicator.fetch_unique(image_urls)
+
         stored_images = []
-        for index, image_url in enumerate(image_urls):
+        for index, image in enumerate(images):
             folder = f"scraped/{uuid.uuid4()}/{index}"
-            public_url, storage_path = await upload_remote_image(image_url, folder=folder)
+            public_url, storage_path = store_image_bytes(
+                image["content"], image["content_type"], folder=folder
+            )
             stored_images.append(
                 {
-                    "source_url": image_url,
+                    "source_url": image["source_url"],
                     "public_url": public_url,
                     "storage_path": storage_path,
                 }
@@ -156,7 +254,8 @@ async def scrape_listing(listing: ListingUrl):
 
         return {"status": "success", "data": stored_images}
 
-
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -167,53 +266,30 @@ class AddAssetRequest(BaseModel):
     asset_name: str
     prompt: str
 
-@router.post("/add-asset-to-view")
-async def add_asset_to_view(request: AddAssetRequest):
+@router.post("/add-asset-to-view", dependencies=[Depends(admit("add_asset"))])
+async def add_asset_to_view(
+    request: AddAssetRequest,
+    flux_service: FluxService = Depends(get_flux_service),
+    generation_service: GenerationService = Depends(get_generation_service),
+):
     """
     Generates an image using Flux API and optionally uploads it to Supabase.
     """
     try:
         # 1. Call Flux API to start generation
         initial_response = await flux_service.add_asset_to_view(request.prompt, request.view_url, request.asset_url, request.asset_name)
-        polling_url = initial_response.get("polling_url")
-        
-        if not polling_url:
-            raise HTTPException(status_code=500, detail="No polling URL received from Flux API")
 
-        # 2. Poll for the result
-        image_url = await flux_service.poll_result(polling_url)
-        
-        # 3. Download the image
-        async with httpx.AsyncClient() as client:
-            image_response = await client.get(image_url)
-            image_response.raise_for_status()
-            image_data = image_response.content
-            
-        # 4. Upload to Supabase
-        content_type = image_response.headers.get("content-type", "image/jpeg")
-        extension = "jpg" if "jpeg" in content_type else "png"
-        file_name = f"{uuid.uuid4()}.{extension}"
-        
-        stored_path = supabase_service.upload_image(
-            image_data, file_name, content_type=content_type, folder="generated"
+        # 2. Poll, download, store and append the result to the view
+        result = await generation_service.run(
+            kind="add_asset",
+            view_id=request.view_id,
+            initial_response=initial_response,
         )
-        public_url = supabase_service.get_public_url(stored_path)
 
-        # 5. Append the edited image to the view
-        edited_images = supabase_service.append_edited_image(request.view_id, public_url)
+        return {"status": "success", "data": result}
 
-        return {
-            "status": "success",
-            "data": {
-                "url": public_url,
-                "original_url": image_url,
-                "view_id": request.view_id,
-                "edited_images": edited_images,
-            },
-        }
-    
+    except HTTPException:
+        raise
     except Exception as e:
-        import traceback
-        print(f"Error during generation: {str(e)}")
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        logger.exception("Error adding asset to view", extra={"kind": "add_asset", "view_id": request.view_id})
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,16 +1,39 @@
 from __future__ import annotations
 
 import base64
+import json
+import logging
+from contextlib import AsyncExitStack, aclosing
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Literal, Optional
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional
 from uuid import uuid4
 
-from fastapi import APIRouter, File, Form, HTTPException, UploadFile
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field, HttpUrl
 
-from app.services.image_store import upload_remote_image
-from app.services.scrape_service import scrape_service
-from app.services.supabase_service import supabase_service
+from app.core.admission import admission_slot
+from app.core.config import get_settings
+from app.core.resilient_fetch import get_resilient_fetcher
+from app.core.http_cache import cache_headers, etag_matches, not_modified, version_etag
+from app.schemas import AssetResult, ChatAppended, CreatedSession, SessionDetail, SessionList
+from app.services.image_dedup import get_image_deduplicator
+from app.services.image_store import store_image_bytes, upload_remote_image
+from app.services import session_events
+from app.services.scrape_service import ScrapeService, get_scrape_service
+from app.services.session_export import stream_session_zip
+from app.services.session_events import (
+  SessionEventBus,
+  forget_session,
+  forget_view,
+  get_session_event_bus,
+  publish_session_event,
+  publish_view_event,
+  view_session_id,
+)
+from app.services.supabase_service import SupabaseService, get_supabase_service
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -24,6 +47,8 @@ class ViewPayload(BaseModel):
 class CreateSessionRequest(BaseModel):
   property_url: HttpUrl
   views: List[ViewPayload] = Field(default_factory=list)
+  # Stream the session and each view as NDJSON lines as soon as they exist.
+  progressive: bool = False
 
 
 class ChatEntryPayload(BaseModel):
@@ -33,10 +58,21 @@ class ChatEntryPayload(BaseModel):
   asset_url: Optional[str] = None
 
 
-async def _persist_image(raw_value: Optional[str], *, folder: str) -> Optional[str]:
+async def _persist_image(
+  raw_value: Optional[str],
+  *,
+  folder: str,
+  supabase_service: SupabaseService,
+  prefetched: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> Optional[str]:
   if not raw_value:
     return None
 
+  if prefetched and raw_value in prefetched:
+    image = prefetched[raw_value]
+    stored_url, _ = store_image_bytes(image["content"], image["content_type"], folder=folder)
+    return stored_url
+
   if raw_value.startswith("data:"):
     try:
       header, encoded = raw_value.split(",", 1)
@@ -61,30 +97,32 @@ async def _persist_image(raw_value: Optional[str], *, folder: str) -> Optional[s
   return raw_value
 
 
-@router.post("/sessions")
-async def create_session(payload: CreateSessionRequest):
-  """Create a new workspace session and seed it with initial views."""
-
-  views_payload = payload.views
-  if not views_payload:
-    scraped_items = await scrape_service.scrape_listing(str(payload.property_url))
-    image_urls = scrape_service.get_image_urls(scraped_items)
-    if not image_urls:
-      raise HTTPException(status_code=404, detail="No images found for the provided listing")
-    views_payload = [
-      ViewPayload(original_image=url, edited_images=[], chat_history=[])
-      for url in image_urls
-    ]
-
-  session_id = supabase_service.create_session()
+async def _seed_session(
+  views_payload: List[ViewPayload],
+  *,
+  supabase_service: SupabaseService,
+  prefetched: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> Dict[str, Any]:
+  # The rows are created together at the end; images are stored under the
+  # id first so a failed upload leaves no half-created session behind.
+  session_id = str(uuid4())
 
   prepared_views: List[Dict[str, Any]] = []
   for idx, view in enumerate(views_payload):
     folder_prefix = f"views/{session_id}/{idx}"
-    original_image = await _persist_image(view.original_image, folder=folder_prefix)
+    original_image = await _persist_image(
+      view.original_image,
+      folder=folder_prefix,
+      supabase_service=supabase_service,
+      prefetched=prefetched,
+    )
     edited_images: List[str] = []
     for image in view.edited_images:
-      stored = await _persist_image(image, folder=f"{folder_prefix}/edited")
+      stored = await _persist_image(
+        image,
+        folder=f"{folder_prefix}/edited",
+        supabase_service=supabase_service,
+      )
       edited_images.append(stored or image)
     prepared_views.append(
       {
@@ -94,7 +132,7 @@ async def create_session(payload: CreateSessionRequest):
       }
     )
 
-  inserted_views = supabase_service.create_views(session_id, prepared_views)
+  inserted_views = supabase_service.create_session_with_views(session_id, prepared_views)
 
   return {
     "session_id": session_id,
@@ -103,16 +141,268 @@ async def create_session(payload: CreateSessionRequest):
   }
 
 
-@router.get("/sessions")
-async def list_sessions(limit: int = 10):
+def _ndjson(line: Dict[str, Any]) -> bytes:
+  return (json.dumps(line, default=str) + "\n").encode()
+
+
+class _AdmittedStreamingResponse(StreamingResponse):
+  """
+  Streaming response that releases an admission slot when it is done.
+
+  The slot is released after the response has been sent, failed or been
+  abandoned, even if the body iterator never started.
+  """
+
+  def __init__(self, content: AsyncIterator[bytes], *, slot: AsyncExitStack, **kwargs: Any):
+    super().__init__(content, **kwargs)
+    self.slot = slot
+
+  async def __call__(self, scope, receive, send) -> None:
+    try:
+      await super().__call__(scope, receive, send)
+    finally:
+      await self.slot.aclose()
+
+
+def _discard_empty_session(session_id: str, supabase_service: SupabaseService) -> None:
+  try:
+    supabase_service.delete_session(session_id)
+    publish_session_event(session_id, session_events.SESSION_DELETED, {})
+    get_session_event_bus().close_session(session_id)
+  except Exception:
+    logger.warning("Error removing empty session %s", session_id, exc_info=True)
+
+
+async def _stream_session(
+  property_url: str,
+  *,
+  supabase_service: SupabaseService,
+  scrape_service: ScrapeService,
+) -> AsyncIterator[bytes]:
+  """
+  Create a session from a listing, yielding each view as soon as it is stored.
+
+  Lines are `session`, then one `view` per stored image, then `done`. An
+  `error` line ends the stream early. Views are also published as
+  `view.created` events. A session that ends up without views is removed
+  again, including when the client disconnects.
+  """
+  session_id = supabase_service.create_session()
+  view_count = 0
+  try:
+    yield _ndjson({"type": "session", "session_id": session_id})
+
+    try:
+      image_urls: List[str] = []
+      async with aclosing(scrape_service.iter_listing(property_url)) as items:
+        async for item in items:
+          image_urls = scrape_service.get_item_image_urls(item)
+          break
+      if not image_urls:
+        raise HTTPException(status_code=404, detail="No images found for the provided listing")
+
+      async with aclosing(get_image_deduplicator().iter_unique(image_urls)) as images:
+        async for image in images:
+          stored_url, _ = store_image_bytes(
+            image["content"],
+            image["content_type"],
+            folder=f"views/{session_id}/{view_count}",
+          )
+          for view in supabase_service.create_views(
+            session_id,
+            [{"original_image": stored_url, "edited_images": [], "chat_history": []}],
+          ):
+            publish_session_event(session_id, session_events.VIEW_CREATED, {"view_id": view.get("id"), "view": view})
+            yield _ndjson({"type": "view", "index": view_count, "view": view})
+            view_count += 1
+
+      if not view_count:
+        raise HTTPException(status_code=502, detail="None of the listing's images could be downloaded")
+    except Exception as exc:
+      status_code = exc.status_code if isinstance(exc, HTTPException) else 500
+      detail = exc.detail if isinstance(exc, HTTPException) else str(exc)
+      logger.warning(
+        "Progressive session creation failed",
+        exc_info=status_code >= 500,
+        extra={"session_id": session_id, "view_count": view_count},
+      )
+      yield _ndjson(
+        {
+          "type": "error",
+          "session_id": session_id,
+          "status_code": status_code,
+          "detail": detail,
+          "view_count": view_count,
+        }
+      )
+      return
+
+    yield _ndjson({"type": "done", "session_id": session_id, "view_count": view_count})
+  finally:
+    # Also runs on GeneratorExit/CancelledError when the client goes away.
+    if not view_count:
+      _discard_empty_session(session_id, supabase_service)
+
+
+@router.post("/sessions", response_model=CreatedSession)
+async def create_session(
+  payload: CreateSessionRequest,
+  request: Request,
+  supabase_service: SupabaseService = Depends(get_supabase_service),
+):
+  """
+  Create a new workspace session and seed it with initial views.
+
+  With `progressive`, a listing import responds with an NDJSON stream (see
+  `_stream_session`) instead of waiting for every image to be ingested.
+  """
+
+  if payload.views:
+    return await _seed_session(payload.views, supabase_service=supabase_service)
+
+  # Scraping plus ingesting a whole listing is expensive; hold an admission
+  # slot for the full pipeline.
+  scrape_service = get_scrape_service()
+  if payload.progressive:
+    # Admit (or reject with 503) before the response starts; the response
+    # releases the slot when it is done.
+    slot = AsyncExitStack()
+    await slot.enter_async_context(admission_slot("create_session", request))
+    return _AdmittedStreamingResponse(
+      _stream_session(
+        str(payload.property_url),
+        supabase_service=supabase_service,
+        scrape_service=scrape_service,
+      ),
+      slot=slot,
+      media_type="application/x-ndjson",
+      headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+  async with admission_slot("create_session", request):
+    scraped_items = await scrape_service.scrape_listing(str(payload.property_url))
+    image_urls = scrape_service.get_image_urls(scraped_items)
+    if not image_urls:
+      raise HTTPException(status_code=404, detail="No images found for the provided listing")
+
+    # Download once, drop near-duplicate shots, then store the bytes we have.
+    images = await get_image_deduplicator().fetch_unique(image_urls)
+    views_payload = [
+      ViewPayload(original_image=image["source_url"], edited_images=[], chat_history=[])
+      for image in images
+    ]
+    return await _seed_session(
+      views_payload,
+      supabase_service=supabase_service,
+      prefetched={image["source_url"]: image for image in images},
+    )
+
+
+@router.get("/sessions", response_model=SessionList)
+async def list_sessions(
+  request: Request,
+  response: Response,
+  limit: int = 10,
+  supabase_service: SupabaseService = Depends(get_supabase_service),
+):
+  # Compare versions first so an unchanged list costs one small query and a 304.
+  etag = version_etag("sessions", limit, supabase_service.list_session_versions(limit=limit))
+  if etag_matches(request, etag):
+    return not_modified(etag)
+
   sessions = supabase_service.list_sessions(limit=limit)
+  response.headers.update(cache_headers(etag))
   return {"sessions": sessions}
 
 
+@router.get("/sessions/{session_id}", response_model=SessionDetail)
+async def get_session(
+  session_id: str,
+  request: Request,
+  response: Response,
+  supabase_service: SupabaseService = Depends(get_supabase_service),
+):
+  version = supabase_service.get_session_version(session_id)
+  if not version:
+    raise HTTPException(status_code=404, detail="Session not found")
+
+  etag = version_etag("session", version)
+  if etag_matches(request, etag):
+    return not_modified(etag)
+
+  session = supabase_service.get_session(session_id)
+  if not session:
+    raise HTTPException(status_code=404, detail="Session not found")
+  response.headers.update(cache_headers(etag))
+  return {"session": session}
+
+
+@router.get("/sessions/{session_id}/events")
+async def stream_session_events(
+  session_id: str,
+  request: Request,
+  since: Optional[str] = None,
+  supabase_service: SupabaseService = Depends(get_supabase_service),
+  event_bus: SessionEventBus = Depends(get_session_event_bus),
+):
+  """
+  Server-sent event stream of session deltas.
+
+  Resumes after the `Last-Event-ID` header (sent automatically by EventSource
+  on reconnect) or the `since` query parameter. A `reset` event means the
+  cursor could not be resumed and the session should be reloaded once.
+  """
+  if not supabase_service.get_session_version(session_id):
+    raise HTTPException(status_code=404, detail="Session not found")
+
+  cursor = request.headers.get("last-event-id") or since
+
+  async def event_stream():
+    async for event in event_bus.subscribe(session_id, cursor):
+      if event is None:
+        yield ": keepalive\n\n"
+        continue
+      yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+  return StreamingResponse(
+    event_stream(),
+    media_type="text/event-stream",
+    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+  )
+
+
+@router.get("/sessions/{session_id}/export")
+async def export_session(
+  session_id: str,
+  supabase_service: SupabaseService = Depends(get_supabase_service),
+):
+  """Stream a ZIP of the session's images, assets and a chat-history manifest."""
+  session = supabase_service.get_session(session_id)
+  if not session:
+    raise HTTPException(status_code=404, detail="Session not found")
+
+  return StreamingResponse(
+    stream_session_zip(
+      session,
+      fetcher=get_resilient_fetcher(),
+      window=get_settings().EXPORT_FETCH_WINDOW,
+    ),
+    media_type="application/zip",
+    headers={"Content-Disposition": f'attachment; filename="session-{session_id}.zip"'},
+  )
+
+
 @router.delete("/sessions/{session_id}")
-async def delete_session(session_id: str):
+async def delete_session(
+  session_id: str,
+  supabase_service: SupabaseService = Depends(get_supabase_service),
+  event_bus: SessionEventBus = Depends(get_session_event_bus),
+):
   try:
     supabase_service.delete_session(session_id)
+    event_bus.publish(session_id, session_events.SESSION_DELETED, {})
+    event_bus.close_session(session_id)
+    forget_session(session_id)
     return {"status": "success", "session_id": session_id}
   except ValueError as exc:
     raise HTTPException(status_code=404, detail=str(exc))
@@ -120,8 +410,12 @@ async def delete_session(session_id: str):
     raise HTTPException(status_code=500, detail=str(exc))
 
 
-@router.post("/views/{view_id}/chat")
-async def append_chat(view_id: str, payload: ChatEntryPayload):
+@router.post("/views/{view_id}/chat", response_model=ChatAppended)
+async def append_chat(
+  view_id: str,
+  payload: ChatEntryPayload,
+  supabase_service: SupabaseService = Depends(get_supabase_service),
+):
   entry = {
     "id": str(uuid4()),
     "role": payload.role,
@@ -132,15 +426,22 @@ async def append_chat(view_id: str, payload: ChatEntryPayload):
   }
 
   history = supabase_service.append_chat_entry(view_id, entry)
-  return {"view_id": view_id, "chat_history": history}
+  event = publish_view_event(view_id, session_events.CHAT_APPENDED, {"entry": entry})
+  return {
+    "view_id": view_id,
+    "entry": entry,
+    "seq": event["seq"] if event else None,
+    "chat_history": history,
+  }
 
 
-@router.post("/views/{view_id}/assets")
+@router.post("/views/{view_id}/assets", response_model=AssetResult)
 async def upload_asset(
   view_id: str,
   name: str = Form(...),
   instructions: Optional[str] = Form(None),
   file: UploadFile = File(...),
+  supabase_service: SupabaseService = Depends(get_supabase_service),
 ):
   contents = await file.read()
   extension = file.filename.split(".")[-1] if "." in file.filename else "png"
@@ -155,6 +456,7 @@ async def upload_asset(
   public_url = supabase_service.get_public_url(storage_path)
 
   asset_record = supabase_service.insert_asset_record(view_id, name, public_url)
+  publish_view_event(view_id, session_events.ASSET_ADDED, {"asset": asset_record})
 
   return {
     "asset": asset_record,
@@ -163,7 +465,11 @@ async def upload_asset(
 
 
 @router.delete("/views/{view_id}/assets/{asset_id}")
-async def delete_asset(view_id: str, asset_id: str):
+async def delete_asset(
+  view_id: str,
+  asset_id: str,
+  supabase_service: SupabaseService = Depends(get_supabase_service),
+):
   asset = supabase_service.get_asset_record(asset_id)
   if not asset:
     raise HTTPException(status_code=404, detail="Asset not found")
@@ -172,15 +478,17 @@ async def delete_asset(view_id: str, asset_id: str):
     raise HTTPException(status_code=400, detail="Asset does not belong to the specified view")
 
   supabase_service.delete_asset_record(asset_id)
+  publish_view_event(view_id, session_events.ASSET_DELETED, {"asset_id": asset_id})
   return {"status": "success", "asset_id": asset_id}
 
 
-@router.patch("/views/{view_id}/assets/{asset_id}")
+@router.patch("/views/{view_id}/assets/{asset_id}", response_model=AssetResult)
 async def update_asset(
   view_id: str,
   asset_id: str,
   name: Optional[str] = Form(None),
   file: Optional[UploadFile] = File(None),
+  supabase_service: SupabaseService = Depends(get_supabase_service),
 ):
   asset = supabase_service.get_asset_record(asset_id)
   if not asset:
@@ -214,13 +522,22 @@ async def update_asset(
   except ValueError as exc:
     raise HTTPException(status_code=404, detail=str(exc))
 
+  publish_view_event(view_id, session_events.ASSET_UPDATED, {"asset": updated})
   return {"asset": updated}
 
 
 @router.delete("/views/{view_id}")
-async def delete_view(view_id: str):
+async def delete_view(
+  view_id: str,
+  supabase_service: SupabaseService = Depends(get_supabase_service),
+):
   try:
+    # Resolve the owning session before the row disappears.
+    session_id = view_session_id(view_id)
     supabase_service.delete_view(view_id)
+    forget_view(view_id)
+    if session_id:
+      publish_session_event(session_id, session_events.VIEW_DELETED, {"view_id": view_id})
     return {"status": "success", "view_id": view_id}
   except Exception as exc:
     raise HTTPException(status_code=500, detail=str(exc))
@@ -0,0 +1,68 @@
+"""Response shapes of the session API, for docs and typed clients."""
+
+from typing import List, Optional
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class _Row(BaseModel):
+    # Rows come straight from the database and may carry more columns.
+    model_config = ConfigDict(extra="allow")
+
+
+class Asset(_Row):
+    id: str
+    name: str
+    url: str
+    view_id: Optional[str] = None
+
+
+class ChatEntry(_Row):
+    id: Optional[str] = None
+    role: str
+    content: str
+    assetName: Optional[str] = None
+    assetUrl: Optional[str] = None
+    createdAt: Optional[str] = None
+
+
+class View(_Row):
+    id: str
+    original_image: Optional[str] = None
+    # Older rows may hold NULL rather than an empty list.
+    edited_images: Optional[List[str]] = Field(default_factory=list)
+    edit_head: int = -1
+    chat_history: Optional[List[ChatEntry]] = Field(default_factory=list)
+    asset_library: List[Asset] = Field(default_factory=list)
+
+
+class Session(_Row):
+    id: str
+    work_date: Optional[str] = None
+    views: List[View] = Field(default_factory=list)
+
+
+class SessionList(BaseModel):
+    sessions: List[Session]
+
+
+class SessionDetail(BaseModel):
+    session: Session
+
+
+class CreatedSession(BaseModel):
+    session_id: str
+    view_count: int
+    views: List[View]
+
+
+class ChatAppended(BaseModel):
+    view_id: str
+    entry: ChatEntry
+    seq: Optional[int] = None
+    chat_history: List[ChatEntry]
+
+
+class AssetResult(BaseModel):
+    asset: Asset
+    public_url: Optional[str] = None
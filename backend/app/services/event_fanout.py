@@ -0,0 +1,117 @@
+import asyncio
+import json
+import logging
+from typing import Any, Dict
+
+from app.core.config import get_settings, require_setting
+from app.core.lazy import ProcessLocal
+from app.services import session_events
+from app.services.session_events import SessionEventBus, get_session_event_bus
+
+try:
+    import asyncpg
+except ImportError:  # pragma: no cover - asyncpg is optional, events stay per worker
+    asyncpg = None
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "session_events"
+# Postgres rejects NOTIFY payloads of 8000 bytes or more.
+MAX_PAYLOAD_BYTES = 7900
+
+
+class EventFanout:
+    """
+    Relays session events between worker processes over Postgres LISTEN/NOTIFY.
+
+    Every event published in this worker is also sent as a notification;
+    notifications from other workers are replayed into the local bus for
+    sessions that have a channel here. Each worker keeps its own sequence
+    numbers, so a client that reconnects to another worker gets a `reset`.
+    If the connection drops, local subscribers get a `reset` once it is back,
+    since notifications sent meanwhile are lost.
+    """
+
+    def __init__(self, dsn: str, bus: SessionEventBus, queue_size: int = 1024, keepalive: float = 15.0):
+        if asyncpg is None:
+            raise RuntimeError("asyncpg is not installed")
+        self.dsn = dsn
+        self.bus = bus
+        self.keepalive = keepalive
+        self._outbox: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        bus.relay = self.send
+
+    def send(self, session_id: str, event_type: str, data: Dict[str, Any]) -> None:
+        """Queue an event published in this worker for the other workers."""
+        message = {"origin": self.bus.epoch, "session_id": session_id, "type": event_type, "data": data}
+        payload = json.dumps(message, default=str)
+        if len(payload.encode()) > MAX_PAYLOAD_BYTES:
+            # Too large to notify; other workers get the event without its
+            # body and clients refetch what it refers to.
+            message["data"] = {"view_id": data.get("view_id"), "truncated": True}
+            payload = json.dumps(message, default=str)
+        try:
+            self._outbox.put_nowait(payload)
+        except asyncio.QueueFull:
+            logger.warning("Dropping cross-worker session event", extra={"session_id": session_id})
+
+    def _receive(self, connection, pid, channel, payload: str) -> None:
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            return
+        if message.get("origin") == self.bus.epoch:
+            return
+        session_id = message["session_id"]
+        self.bus.publish_remote(session_id, message["type"], message.get("data") or {})
+        if message["type"] == session_events.SESSION_DELETED:
+            self.bus.close_session(session_id)
+            session_events.forget_session(session_id)
+        elif message["type"] == session_events.VIEW_DELETED:
+            session_events.forget_view((message.get("data") or {}).get("view_id"))
+
+    async def run_forever(self) -> None:
+        delay = 1.0
+        reconnecting = False
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                await connection.add_listener(CHANNEL, self._receive)
+                if reconnecting:
+                    self.bus.reset_all()
+                delay = 1.0
+                await self._send_loop(connection)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Session event fan-out disconnected; retrying in %ss", delay, exc_info=True)
+            finally:
+                if connection is not None:
+                    connection.terminate()
+            reconnecting = True
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+    async def _send_loop(self, connection) -> None:
+        while True:
+            try:
+                payload = await asyncio.wait_for(self._outbox.get(), self.keepalive)
+            except asyncio.TimeoutError:
+                # Surfaces a dead connection even when nothing is published.
+                await connection.execute("SELECT 1")
+                continue
+            try:
+                await connection.execute("SELECT pg_notify($1, $2)", CHANNEL, payload)
+            except Exception:
+                # Send it again after reconnecting.
+                if not self._outbox.full():
+                    self._outbox.put_nowait(payload)
+                raise
+
+
+# Started by warmup_services when EVENTS_DATABASE_URL is configured.
+_event_fanout = ProcessLocal(
+    "event_fanout",
+    lambda: EventFanout(require_setting(get_settings(), "EVENTS_DATABASE_URL"), get_session_event_bus()),
+)
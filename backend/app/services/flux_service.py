@@ -1,16 +1,53 @@
 import httpx
 import asyncio
-from app.core.config import settings
+import logging
+from typing import Optional
+from urllib.parse import urlparse
+
+from app.core.config import Settings, get_settings, require_setting
+from app.core.lazy import ProcessLocal
+
+logger = logging.getLogger(__name__)
+
+# Polling statuses after which the task will never produce a result.
+FAILED_STATUSES = {"Failed", "Error", "Request Moderated", "Content Moderated", "Task not found"}
+
+
+class GenerationFailedError(RuntimeError):
+    """Flux reported that the task itself failed; polling again will not help."""
+
 
 class FluxService:
-    def __init__(self):
-        self.api_key = settings.BFL_API_KEY
+    def __init__(self, settings: Settings):
+        self.api_key = require_setting(settings, "BFL_API_KEY")
         self.base_url = settings.FLUX_API_URL
         self.headers = {
             "x-key": self.api_key,
             "Content-Type": "application/json",
             "accept": "application/json"
         }
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Shared connection pool, created on first use inside the worker's event loop."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=180.0,
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=10),
+            )
+        return self._client
+
+    async def warmup(self):
+        """Open a pooled connection to the Flux host before the worker accepts traffic."""
+        url = urlparse(self.base_url)
+        # Any response will do; the point is the TCP/TLS handshake.
+        await self.client.head(f"{url.scheme}://{url.netloc}/", timeout=10.0)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
 
     async def update_image(
         self,
@@ -22,28 +59,31 @@ class FluxService:
     ):
         """Call the Flux API to update an existing image using its URL."""
 
-        async with httpx.AsyncClient() as client:
-            payload = {
-                "prompt": prompt,
-                "input_image": input_image,
-                "aspect_ratio": aspect_ratio,
-                **kwargs,
-            }
-            try:
-                response = await client.post(
-                    self.base_url,
-                    json=payload,
-                    headers=self.headers,
-                    timeout=180.0,
-                )
-                response.raise_for_status()
-                return response.json()
-            except httpx.HTTPStatusError as e:
-                print(f"Error calling Flux API: {e.response.text}")
-                raise e
-            except Exception as e:
-                print(f"An error occurred: {str(e)}")
-                raise e
+        payload = {
+            "prompt": prompt,
+            "input_image": input_image,
+            "aspect_ratio": aspect_ratio,
+            **kwargs,
+        }
+        try:
+            response = await self.client.post(
+                self.base_url,
+                json=payload,
+                headers=self.headers,
+                timeout=180.0,
+            )
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPStatusError as e:
+            logger.warning(
+                "Flux API returned %s",
+                e.response.status_code,
+                extra={"response": e.response.text[:500]},
+            )
+            raise e
+        except Exception as e:
+            logger.warning("Error calling Flux API: %s", type(e).__name__, extra={"error": str(e)})
+            raise e
 
     async def add_asset_to_view(self, prompt: str, view_url: str, asset_url: str, asset_name: str, **kwargs):
         """
@@ -71,50 +111,61 @@ You are an expert Virtual Stager and Interior Renovation AI. Your primary functi
             """.strip() +f"\n\n### TASK\nExtract the asset named '{asset_name}' from the second image and integrate it into the first image realistically according to the prompt: {prompt}"
         )
 
-        async with httpx.AsyncClient() as client:
-            payload = {
-                "prompt": final_prompt,
-                "input_image": view_url,
-                "input_image_2": asset_url,
-                **kwargs
-            }
-            try:
-                response = await client.post(self.base_url, json=payload, headers=self.headers, timeout=180.0)
-                response.raise_for_status()
-                return response.json()
-            except httpx.HTTPStatusError as e:
-                print(f"Error calling Flux API: {e.response.text}")
-                raise e
-            except Exception as e:
-                print(f"An error occurred: {str(e)}")
-                raise e
+        payload = {
+            "prompt": final_prompt,
+            "input_image": view_url,
+            "input_image_2": asset_url,
+            **kwargs
+        }
+        try:
+            response = await self.client.post(self.base_url, json=payload, headers=self.headers, timeout=180.0)
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPStatusError as e:
+            logger.warning(
+                "Flux API returned %s",
+                e.response.status_code,
+                extra={"response": e.response.text[:500]},
+            )
+            raise e
+        except Exception as e:
+            logger.warning("Error calling Flux API: %s", type(e).__name__, extra={"error": str(e)})
+            raise e
 
 
     async def poll_result(self, polling_url: str, interval: float = 2.0, timeout: float = 180.0):
         """
         Polls the polling_url until the image is ready or timeout is reached.
         """
-        async with httpx.AsyncClient() as client:
-            start_time = asyncio.get_event_loop().time()
-            while (asyncio.get_event_loop().time() - start_time) < timeout:
-                try:
-                    response = await client.get(polling_url, headers=self.headers, timeout=180.0)
-                    response.raise_for_status()
-                    data = response.json()
-                    
-                    # Check status based on BFL API response structure
-                    # Usually it returns status: "Ready" or similar, and result with sample url
-                    if data.get("status") == "Ready":
-                        return data.get("result", {}).get("sample")
-                    elif data.get("status") == "Failed":
-                        raise Exception(f"Generation failed: {data}")
-                    
-                    # Wait before next poll
-                    await asyncio.sleep(interval)
-                except Exception as e:
-                    print(f"Error polling Flux API: {str(e)}")
-                    raise e
-            
-            raise TimeoutError("Image generation timed out")
-
-flux_service = FluxService()
+        start_time = asyncio.get_event_loop().time()
+        while (asyncio.get_event_loop().time() - start_time) < timeout:
+            try:
+                response = await self.client.get(polling_url, headers=self.headers, timeout=180.0)
+                response.raise_for_status()
+                data = response.json()
+                
+                # Check status based on BFL API response structure
+                # Usually it returns status: "Ready" or similar, and result with sample url
+                if data.get("status") == "Ready":
+                    return data.get("result", {}).get("sample")
+                elif data.get("status") in FAILED_STATUSES:
+                    raise GenerationFailedError(f"Generation failed: {data}")
+
+                logger.debug(
+                    "Flux task pending",
+                    extra={"status": data.get("status"), "sampled": True},
+                )
+                # Wait before next poll
+                await asyncio.sleep(interval)
+            except Exception as e:
+                logger.warning("Error polling Flux API: %s", type(e).__name__, extra={"error": str(e)})
+                raise e
+        
+        raise TimeoutError("Image generation timed out")
+
+_flux_service = ProcessLocal("flux_service", lambda: FluxService(get_settings()))
+
+
+def get_flux_service() -> FluxService:
+    return _flux_service.get()
+
@@ -0,0 +1,177 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+
+from app.core.config import get_settings
+from app.core.lazy import ProcessLocal
+
+# Job stages, in the order a generation moves through them.
+STAGE_SUBMITTED = "submitted"  # Flux task accepted, polling URL known
+STAGE_READY = "ready"          # Flux result URL known
+STAGE_STORED = "stored"        # Result uploaded to Supabase storage
+STAGE_COMPLETED = "completed"  # Result appended to the view
+STAGE_FAILED = "failed"
+
+TERMINAL_STAGES = (STAGE_COMPLETED, STAGE_FAILED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS generation_jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    view_id TEXT NOT NULL,
+    task_id TEXT,
+    polling_url TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    result_url TEXT,
+    stored_url TEXT,
+    payload TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    owner TEXT,
+    lease_until REAL NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS generation_jobs_stage_idx ON generation_jobs (stage);
+"""
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class GenerationJournal:
+    """
+    Durable record of submitted Flux tasks.
+
+    Every paid generation is written here before polling starts, so a worker
+    that dies mid-generation leaves enough behind (polling URL, target view,
+    stage reached) for another worker to finish the job.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def record_submitted(
+        self,
+        *,
+        kind: str,
+        view_id: str,
+        polling_url: str,
+        task_id: Optional[str] = None,
+        payload: Optional[Dict[str, Any]] = None,
+        lease_seconds: float,
+    ) -> Dict[str, Any]:
+        now = time.time()
+        job = {
+            "id": str(uuid4()),
+            "kind": kind,
+            "view_id": view_id,
+            "task_id": task_id,
+            "polling_url": polling_url,
+            "stage": STAGE_SUBMITTED,
+            "payload": json.dumps(payload or {}),
+            "owner": worker_id(),
+            "lease_until": now + lease_seconds,
+            "created_at": now,
+            "updated_at": now,
+        }
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO generation_jobs
+                    (id, kind, view_id, task_id, polling_url, stage, payload,
+                     owner, lease_until, created_at, updated_at)
+                VALUES
+                    (:id, :kind, :view_id, :task_id, :polling_url, :stage, :payload,
+                     :owner, :lease_until, :created_at, :updated_at)
+                """,
+                job,
+            )
+        return self.get(job["id"])
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM generation_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return _row_to_job(row) if row else None
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        if "payload" in fields:
+            fields["payload"] = json.dumps(fields["payload"] or {})
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = :{name}" for name in fields)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE generation_jobs SET {assignments} WHERE id = :job_id",
+                {**fields, "job_id": job_id},
+            )
+
+    def renew_lease(self, job_id: str, lease_seconds: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE generation_jobs SET lease_until = ? WHERE id = ? AND owner = ?",
+                (time.time() + lease_seconds, job_id, worker_id()),
+            )
+
+    def claim_expired(self, lease_seconds: float, limit: int = 20) -> List[Dict[str, Any]]:
+        """Take ownership of unfinished jobs whose previous owner stopped renewing."""
+        now = time.time()
+        owner = worker_id()
+        claimed: List[Dict[str, Any]] = []
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT id FROM generation_jobs
+                WHERE stage NOT IN (?, ?) AND lease_until < ?
+                ORDER BY created_at
+                LIMIT ?
+                """,
+                (*TERMINAL_STAGES, now, limit),
+            ).fetchall()
+            for row in rows:
+                # Compare-and-set on the lease so concurrent workers never
+                # claim the same job.
+                cursor = self._conn.execute(
+                    """
+                    UPDATE generation_jobs
+                    SET owner = ?, lease_until = ?, attempts = attempts + 1, updated_at = ?
+                    WHERE id = ? AND lease_until < ? AND stage NOT IN (?, ?)
+                    """,
+                    (owner, now + lease_seconds, now, row["id"], now, *TERMINAL_STAGES),
+                )
+                if cursor.rowcount:
+                    claimed.append(row["id"])
+        return [job for job in (self.get(job_id) for job_id in claimed) if job]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _row_to_job(row: sqlite3.Row) -> Dict[str, Any]:
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"]) if job.get("payload") else {}
+    return job
+
+
+_generation_journal = ProcessLocal(
+    "generation_journal",
+    lambda: GenerationJournal(get_settings().GENERATION_JOURNAL_PATH),
+)
+
+
+def get_generation_journal() -> GenerationJournal:
+    return _generation_journal.get()
@@ -0,0 +1,322 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Set
+
+import httpx
+from fastapi import HTTPException
+
+from app.core.config import Settings, get_settings
+from app.core.lazy import ProcessLocal
+from app.core.logs import bind_job
+from app.core.resilient_fetch import FetchError, ResilientFetcher, get_resilient_fetcher
+from app.services.flux_service import FluxService, GenerationFailedError, get_flux_service
+from app.services.generation_journal import (
+    STAGE_COMPLETED,
+    STAGE_FAILED,
+    STAGE_READY,
+    STAGE_STORED,
+    STAGE_SUBMITTED,
+    GenerationJournal,
+    get_generation_journal,
+)
+from app.services import session_events
+from app.services.image_store import fetch_error_to_http
+from app.services.session_events import publish_view_event
+from app.services.supabase_service import SupabaseService, get_supabase_service
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationService:
+    """
+    Drives a submitted Flux task to a stored, view-attached image.
+
+    Each step is recorded in the generation journal before moving on, so the
+    same code path can pick a job up from whatever stage a crashed worker
+    reached (see `recover_forever`).
+    """
+
+    def __init__(
+        self,
+        flux: FluxService,
+        supabase: SupabaseService,
+        journal: GenerationJournal,
+        fetcher: ResilientFetcher,
+        settings: Settings,
+    ):
+        self.flux = flux
+        self.supabase = supabase
+        self.journal = journal
+        self.fetcher = fetcher
+        self.lease_seconds = settings.GENERATION_LEASE_SECONDS
+        self.recovery_interval = settings.GENERATION_RECOVERY_INTERVAL
+        self.max_attempts = settings.GENERATION_MAX_ATTEMPTS
+        self._recovering: Set[asyncio.Task] = set()
+
+    async def run(
+        self,
+        *,
+        kind: str,
+        view_id: str,
+        initial_response: Dict[str, Any],
+        payload: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Journal a freshly submitted Flux task and wait for its result."""
+        polling_url = initial_response.get("polling_url")
+        if not polling_url:
+            raise HTTPException(status_code=500, detail="No polling URL received from Flux API")
+
+        job = self.journal.record_submitted(
+            kind=kind,
+            view_id=view_id,
+            polling_url=polling_url,
+            task_id=initial_response.get("id"),
+            payload=payload,
+            lease_seconds=self.lease_seconds,
+        )
+        return await self.drive(job)
+
+    async def drive(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        with bind_job(job["id"]):
+            heartbeat = asyncio.create_task(self._heartbeat(job["id"]))
+            try:
+                return await self._advance(job)
+            except Exception as exc:
+                await self._record_failure(job["id"], exc)
+                raise
+            finally:
+                heartbeat.cancel()
+
+    async def run_pipeline(
+        self,
+        *,
+        view_id: str,
+        input_image: str,
+        steps: List[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        """
+        Run several edits back to back on one view.
+
+        Each step is submitted with the previous step's Flux delivery URL as
+        its input, so intermediate results are never downloaded or uploaded.
+        Only the final image, plus steps flagged as `checkpoint`, are stored
+        and added to the view's edit history.
+        """
+        initial_response = await self._submit_step(steps[0], input_image)
+        return await self.run(
+            kind="pipeline",
+            view_id=view_id,
+            initial_response=initial_response,
+            payload={"steps": steps, "step": 0, "checkpoints": []},
+        )
+
+    async def _submit_step(self, step: Dict[str, Any], input_image: str) -> Dict[str, Any]:
+        if step.get("asset_url"):
+            return await self.flux.add_asset_to_view(
+                step["prompt"],
+                input_image,
+                step["asset_url"],
+                step.get("asset_name") or "asset",
+            )
+        return await self.flux.update_image(step["prompt"], input_image=input_image)
+
+    async def _advance(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        job_id = job["id"]
+        view_id = job["view_id"]
+        payload = job.get("payload") or {}
+
+        while job["stage"] == STAGE_SUBMITTED:
+            steps = payload.get("steps") or []
+            step = payload.get("step", 0)
+
+            if payload.get("submitting") is not None:
+                # A worker died after submitting the next step but before
+                # journaling its polling URL. Flux may already be running (and
+                # billing) it, so do not submit it a second time.
+                raise GenerationFailedError(
+                    f"Interrupted while submitting pipeline step {payload['submitting'] + 1}; "
+                    "not resubmitted to avoid a duplicate charge"
+                )
+
+            # Intermediate results are journaled, so a retry after a failure
+            # later in this step does not poll (or pay for) the step again.
+            result_url = payload.get("step_result")
+            if result_url is None:
+                result_url = await self.flux.poll_result(job["polling_url"])
+                if step + 1 >= len(steps):
+                    self.journal.update(job_id, stage=STAGE_READY, result_url=result_url)
+                    job = {**job, "stage": STAGE_READY, "result_url": result_url}
+                    break
+                payload = {**payload, "step_result": result_url}
+                self.journal.update(job_id, payload=payload)
+
+            # Intermediate pipeline step: persist only if asked to, then feed
+            # the delivery URL straight into the next submission.
+            if steps[step].get("checkpoint") and step not in payload.get("checkpointed", []):
+                stored_url = await self._store_result(result_url, f"{job_id}-{step}")
+                self._attach(view_id, stored_url)
+                payload = {
+                    **payload,
+                    "checkpoints": [*payload.get("checkpoints", []), stored_url],
+                    "checkpointed": [*payload.get("checkpointed", []), step],
+                }
+                self.journal.update(job_id, payload=payload)
+
+            payload = {**payload, "submitting": step + 1}
+            self.journal.update(job_id, payload=payload)
+            try:
+                next_response = await self._submit_step(steps[step + 1], result_url)
+            except httpx.HTTPStatusError:
+                # Flux rejected the submission, so nothing was started.
+                payload = {**payload, "submitting": None}
+                self.journal.update(job_id, payload=payload)
+                raise
+            polling_url = next_response.get("polling_url")
+            if not polling_url:
+                raise HTTPException(status_code=500, detail="No polling URL received from Flux API")
+            payload = {
+                **payload,
+                "step": step + 1,
+                "input_url": result_url,
+                "step_result": None,
+                "submitting": None,
+            }
+            self.journal.update(
+                job_id,
+                polling_url=polling_url,
+                task_id=next_response.get("id"),
+                payload=payload,
+            )
+            job = {**job, "polling_url": polling_url, "payload": payload}
+
+        if job["stage"] == STAGE_READY:
+            # Named after the job so a retried upload overwrites instead of
+            # leaving an orphaned copy behind.
+            stored_url = await self._store_result(job["result_url"], job_id)
+            self.journal.update(job_id, stage=STAGE_STORED, stored_url=stored_url)
+            job = {**job, "stage": STAGE_STORED, "stored_url": stored_url}
+
+        if job["stage"] == STAGE_STORED:
+            view = self._attach(view_id, job["stored_url"])
+            self.journal.update(job_id, stage=STAGE_COMPLETED, owner=None, lease_until=0)
+            job = {**job, "stage": STAGE_COMPLETED, "edited_images": view.get("edited_images") or []}
+
+        result = {
+            "url": job["stored_url"],
+            "original_url": job["result_url"],
+            "view_id": view_id,
+            "edited_images": job.get("edited_images") or [],
+        }
+        if job["kind"] == "pipeline":
+            result["checkpoints"] = payload.get("checkpoints", [])
+            result["steps"] = len(payload.get("steps") or [])
+        return result
+
+    async def _store_result(self, result_url: str, name: str) -> str:
+        # Retried and hedged: the generation is already paid for.
+        try:
+            image_response = await self.fetcher.get(result_url)
+        except FetchError as exc:
+            raise fetch_error_to_http(exc)
+
+        content_type = image_response.headers.get("content-type", "image/jpeg")
+        extension = "jpg" if "jpeg" in content_type else "png"
+        stored_path = self.supabase.upload_image(
+            image_response.content,
+            f"{name}.{extension}",
+            content_type=content_type,
+            folder="generated",
+            upsert=True,
+        )
+        return self.supabase.get_public_url(stored_path)
+
+    def _attach(self, view_id: str, stored_url: str) -> Dict[str, Any]:
+        # Idempotent, so a retry after a crash does not add the image twice.
+        view = self.supabase.push_edit(view_id, stored_url)
+        publish_view_event(
+            view_id,
+            session_events.IMAGE_EDITED,
+            {"url": stored_url, "edit_head": view.get("edit_head")},
+        )
+        return view
+
+    async def _record_failure(self, job_id: str, exc: Exception) -> None:
+        job = self.journal.get(job_id)
+        if not job:
+            return
+        if isinstance(exc, GenerationFailedError) or job["attempts"] >= self.max_attempts:
+            # Flux failed the task, or retrying has not helped; give up.
+            await self._fail(job, str(exc))
+        else:
+            # The task is paid for and may still finish (e.g. a transient poll
+            # error or a poll timeout); release the lease so recovery retries it.
+            self.journal.update(job_id, error=str(exc), owner=None, lease_until=0)
+
+    async def _fail(self, job: Dict[str, Any], error: Optional[str]) -> None:
+        """Mark a job failed for good, keeping a pipeline's last paid-for result."""
+        self.journal.update(job["id"], stage=STAGE_FAILED, error=error, owner=None, lease_until=0)
+        if job["kind"] != "pipeline" or job["stage"] != STAGE_SUBMITTED:
+            return
+
+        payload = job.get("payload") or {}
+        step = payload.get("step", 0)
+        if payload.get("step_result"):
+            salvage_step, salvage_url = step, payload["step_result"]
+        elif step > 0 and payload.get("input_url"):
+            salvage_step, salvage_url = step - 1, payload["input_url"]
+        else:
+            return
+        try:
+            # Same name as a checkpoint of that step, so nothing is stored twice.
+            stored_url = await self._store_result(salvage_url, f"{job['id']}-{salvage_step}")
+            self._attach(job["view_id"], stored_url)
+        except Exception:
+            # Flux delivery URLs expire; there may be nothing left to keep.
+            logger.warning("Could not keep result of pipeline step %s", salvage_step + 1, exc_info=True)
+
+    async def _heartbeat(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            self.journal.renew_lease(job_id, self.lease_seconds)
+
+    async def recover_forever(self) -> None:
+        """Resume journaled jobs whose worker stopped renewing their lease."""
+        while True:
+            try:
+                self._recover_expired()
+            except Exception:
+                # e.g. "database is locked" with several workers on one
+                # journal; the next sweep tries again.
+                logger.exception("Error sweeping the generation journal")
+            await asyncio.sleep(self.recovery_interval)
+
+    def _recover_expired(self) -> None:
+        for job in self.journal.claim_expired(self.lease_seconds):
+            if job["attempts"] > self.max_attempts:
+                task = asyncio.create_task(self._fail(job, job.get("error")))
+            else:
+                task = asyncio.create_task(self._resume(job))
+            self._recovering.add(task)
+            task.add_done_callback(self._recovering.discard)
+
+    async def _resume(self, job: Dict[str, Any]) -> None:
+        try:
+            await self.drive(job)
+        except Exception:
+            logger.exception("Error resuming generation", extra={"job_id": job["id"]})
+
+
+_generation_service = ProcessLocal(
+    "generation_service",
+    lambda: GenerationService(
+        get_flux_service(),
+        get_supabase_service(),
+        get_generation_journal(),
+        get_resilient_fetcher(),
+        get_settings(),
+    ),
+)
+
+
+def get_generation_service() -> GenerationService:
+    return _generation_service.get()
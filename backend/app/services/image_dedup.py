@@ -0,0 +1,175 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from app.core.config import Settings, get_settings
+from app.core.lazy import ProcessLocal
+from app.services.image_store import fetch_remote_image
+
+logger = logging.getLogger(__name__)
+
+HASH_SIZE = 8
+_DCT_SIZE = 32
+
+
+def _dct_matrix(size: int) -> np.ndarray:
+    """Orthonormal DCT-II basis, so a 2-D DCT is `D @ X @ D.T`."""
+    n = np.arange(size)
+    matrix = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / (2 * size))
+    matrix[0, :] *= 1 / np.sqrt(2)
+    return matrix * np.sqrt(2 / size)
+
+
+_DCT = _dct_matrix(_DCT_SIZE)
+
+
+def perceptual_hash(content: bytes) -> Optional[Tuple[int, int]]:
+    """
+    64-bit DCT perceptual hash of an encoded image, plus its pixel count.
+
+    Runs in a worker process. Returns None for bytes that cannot be decoded.
+    """
+    try:
+        with Image.open(io.BytesIO(content)) as image:
+            pixels = image.width * image.height
+            gray = image.convert("L").resize((_DCT_SIZE, _DCT_SIZE), Image.LANCZOS)
+    except Exception:
+        return None
+
+    coefficients = _DCT @ np.asarray(gray, dtype=np.float64) @ _DCT.T
+    low = coefficients[:HASH_SIZE, :HASH_SIZE].flatten()
+    # The DC term only encodes overall brightness; keep it out of the median.
+    bits = low > np.median(low[1:])
+    return int(np.packbits(bits).view(">u8")[0]), pixels
+
+
+def hamming_distances(hashes: np.ndarray, others: np.ndarray) -> np.ndarray:
+    """Pairwise Hamming distances between two uint64 hash vectors."""
+    xor = hashes[:, None] ^ others[None, :]
+    return np.unpackbits(xor.view(np.uint8).reshape(*xor.shape, 8), axis=-1).sum(axis=-1)
+
+
+def representative_indexes(hashes: np.ndarray, pixels: np.ndarray, threshold: int) -> List[int]:
+    """
+    Greedily cluster hashes within `threshold` bits and keep one per cluster.
+
+    Larger images are considered first, so each cluster keeps its highest
+    resolution member. Returned indexes are in their original order.
+    """
+    if len(hashes) == 0:
+        return []
+    distances = hamming_distances(hashes, hashes)
+    kept: List[int] = []
+    for index in np.argsort(-pixels, kind="stable"):
+        if not kept or not (distances[index, kept] <= threshold).any():
+            kept.append(int(index))
+    return sorted(kept)
+
+
+class ImageDeduplicator:
+    """Drops near-duplicate scraped photos before they become views."""
+
+    def __init__(self, settings: Settings):
+        self.enabled = settings.SCRAPE_DEDUP_ENABLED
+        self.threshold = settings.SCRAPE_DEDUP_THRESHOLD
+        self.fetch_concurrency = settings.SCRAPE_FETCH_CONCURRENCY
+        self._workers = settings.SCRAPE_DEDUP_WORKERS
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Spawned rather than forked: the parent runs an event loop and
+            # client threads that must not be duplicated into the workers.
+            self._pool = ProcessPoolExecutor(
+                max_workers=self._workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def fetch_all(self, urls: List[str]) -> List[Dict[str, Any]]:
+        """Download images concurrently, preserving the input order."""
+        semaphore = asyncio.Semaphore(self.fetch_concurrency)
+
+        async def fetch(url: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await fetch_remote_image(url)
+
+        return list(await asyncio.gather(*(fetch(url) for url in urls)))
+
+    async def dedupe(self, images: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Keep one representative per cluster of near-identical images."""
+        if not self.enabled or len(images) < 2:
+            return images
+
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(
+            *(loop.run_in_executor(self.pool, perceptual_hash, image["content"]) for image in images)
+        )
+
+        # Undecodable images cannot be compared; keep them as they are.
+        hashed = [index for index, result in enumerate(results) if result is not None]
+        hashes = np.array([results[index][0] for index in hashed], dtype=np.uint64)
+        pixels = np.array([results[index][1] for index in hashed], dtype=np.int64)
+        keep = {hashed[index] for index in representative_indexes(hashes, pixels, self.threshold)}
+        keep.update(index for index, result in enumerate(results) if result is None)
+        return [image for index, image in enumerate(images) if index in keep]
+
+    async def fetch_unique(self, urls: List[str]) -> List[Dict[str, Any]]:
+        return await self.dedupe(await self.fetch_all(urls))
+
+    async def iter_unique(self, urls: List[str]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield each image as soon as it is downloaded and hashed.
+
+        Images arrive in completion order. An image within the threshold of
+        one already yielded is dropped, so the first copy to arrive wins
+        instead of the largest one. Images that fail to download are logged
+        and skipped.
+        """
+        semaphore = asyncio.Semaphore(self.fetch_concurrency)
+        loop = asyncio.get_running_loop()
+
+        async def fetch(url: str) -> Tuple[Dict[str, Any], Optional[Tuple[int, int]]]:
+            async with semaphore:
+                image = await fetch_remote_image(url)
+            if not self.enabled:
+                return image, None
+            return image, await loop.run_in_executor(self.pool, perceptual_hash, image["content"])
+
+        tasks = [asyncio.create_task(fetch(url)) for url in urls]
+        kept = np.empty(0, dtype=np.uint64)
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    image, result = await next_done
+                except Exception as exc:
+                    logger.warning("Skipping scraped image that failed to download", extra={"error": str(exc)})
+                    continue
+                if result is not None:
+                    candidate = np.array([result[0]], dtype=np.uint64)
+                    if len(kept) and (hamming_distances(candidate, kept) <= self.threshold).any():
+                        continue
+                    kept = np.append(kept, candidate)
+                yield image
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+_image_deduplicator = ProcessLocal("image_deduplicator", lambda: ImageDeduplicator(get_settings()))
+
+
+def get_image_deduplicator() -> ImageDeduplicator:
+    return _image_deduplicator.get()
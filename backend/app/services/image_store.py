@@ -1,15 +1,12 @@
 from __future__ import annotations
 
-from typing import Optional, Tuple
+from typing import Any, Dict, Optional, Tuple
 from uuid import uuid4
 
-import httpx
 from fastapi import HTTPException
 
-from app.services.supabase_service import supabase_service
-
-DEFAULT_TIMEOUT = 30
-
+from app.core.resilient_fetch import CircuitOpenError, FetchError, get_resilient_fetcher
+from app.services.supabase_service import get_supabase_service
 
 def _derive_extension(content_type: Optional[str]) -> str:
   if not content_type:
@@ -22,30 +19,60 @@ def _derive_extension(content_type: Optional[str]) -> str:
   return "jpg"
 
 
-async def upload_remote_image(
-  url: str,
+def fetch_error_to_http(exc: FetchError) -> HTTPException:
+  if isinstance(exc, CircuitOpenError):
+    return HTTPException(
+      status_code=503,
+      detail=str(exc),
+      headers={"Retry-After": str(max(1, round(exc.retry_after or 1)))},
+    )
+  return HTTPException(status_code=502, detail=f"Failed to fetch image: {exc}")
+
+
+async def fetch_remote_image(url: str) -> Dict[str, Any]:
+  """Download a remote image; returns its bytes and content type."""
+
+  try:
+    response = await get_resilient_fetcher().get(url)
+  except FetchError as exc:
+    raise fetch_error_to_http(exc)
+
+  return {
+    "source_url": url,
+    "content": response.content,
+    "content_type": response.headers.get("content-type", "image/jpeg"),
+  }
+
+
+def store_image_bytes(
+  content: bytes,
+  content_type: str,
   *,
   folder: Optional[str] = None,
-  timeout: int = DEFAULT_TIMEOUT,
 ) -> Tuple[str, str]:
-  """Download a remote image and store it in Supabase."""
+  """Store already downloaded image bytes in Supabase."""
 
-  try:
-    async with httpx.AsyncClient(timeout=timeout) as client:
-      response = await client.get(url)
-      response.raise_for_status()
-  except Exception as exc:  # pragma: no cover - network defensive
-    raise HTTPException(status_code=502, detail=f"Failed to fetch image: {exc}")
-
-  content_type = response.headers.get("content-type", "image/jpeg")
+  supabase_service = get_supabase_service()
   extension = _derive_extension(content_type)
   file_name = f"{uuid4()}.{extension}"
 
   storage_path = supabase_service.upload_image(
-    response.content,
+    content,
     file_name,
     content_type=content_type,
     folder=folder,
   )
   public_url = supabase_service.get_public_url(storage_path)
   return public_url, storage_path
+
+
+async def upload_remote_image(
+  url: str,
+  *,
+  folder: Optional[str] = None,
+) -> Tuple[str, str]:
+  """Download a remote image and store it in Supabase."""
+
+  get_supabase_service()  # fail fast before downloading if storage is unavailable
+  image = await fetch_remote_image(url)
+  return store_image_bytes(image["content"], image["content_type"], folder=folder)
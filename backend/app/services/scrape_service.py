@@ -1,10 +1,18 @@
+import asyncio
+from typing import Any, AsyncIterator, Dict, List
+
 from fastapi import HTTPException
-from app.core.config import settings
+from app.core.config import Settings, get_settings, require_setting
+from app.core.lazy import ProcessLocal
 from apify_client import ApifyClient
 
+# Apify run states after which no more dataset items will appear.
+TERMINAL_RUN_STATUSES = {"SUCCEEDED", "FAILED", "ABORTED", "TIMED-OUT"}
+
+
 class ScrapeService:
-    def __init__(self):
-        self.api_key = settings.APIFY_CLIENT_TOKEN
+    def __init__(self, settings: Settings):
+        self.api_key = require_setting(settings, "APIFY_CLIENT_TOKEN")
         self.client = ApifyClient(self.api_key)
         self.actor_id = settings.APIFY_ACTOR_ID
 
@@ -24,11 +32,45 @@ class ScrapeService:
 
         return results
 
+    async def iter_listing(self, url: str, poll_seconds: int = 2) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Starts the Actor and yields dataset items as soon as they are written.
+
+        Unlike `scrape_listing` this does not wait for the run to finish. The
+        blocking Apify client calls run in a thread so the event loop is free.
+        """
+        run = await asyncio.to_thread(
+            self.client.actor(self.actor_id).start, run_input={"startUrls": [url]}
+        )
+        run_client = self.client.run(run["id"])
+        dataset = self.client.dataset(run["defaultDatasetId"])
+
+        offset = 0
+        while True:
+            # Read the status before the items so items written just before
+            # the run finished are still picked up on this pass.
+            finished = run.get("status") in TERMINAL_RUN_STATUSES
+            page = await asyncio.to_thread(dataset.list_items, offset=offset)
+            for item in page.items:
+                offset += 1
+                yield item
+            if finished:
+                if run.get("status") != "SUCCEEDED" and offset == 0:
+                    raise HTTPException(status_code=502, detail=f"Scrape run {run.get('status', '').lower()}")
+                return
+            # Returns early once the run finishes.
+            run = await asyncio.to_thread(run_client.wait_for_finish, wait_secs=poll_seconds) or run
+
     def get_image_urls(self, scraped_items):
         """
         Extracts image URLs from the scraped items.
         """
-        item = scraped_items[0]
+        return self.get_item_image_urls(scraped_items[0])
+
+    def get_item_image_urls(self, item: Dict[str, Any]) -> List[str]:
+        """
+        Extracts image URLs from a single scraped listing item.
+        """
         sections = item.get("sections", [])
         if not sections:
             raise HTTPException(status_code=404, detail="No sections found in the scraped item")
@@ -45,4 +87,8 @@ class ScrapeService:
 
         return data
 
-scrape_service = ScrapeService()
\ No newline at end of file
+_scrape_service = ProcessLocal("scrape_service", lambda: ScrapeService(get_settings()))
+
+
+def get_scrape_service() -> ScrapeService:
+    return _scrape_service.get()
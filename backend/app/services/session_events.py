@@ -0,0 +1,260 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Optional, Set, Tuple
+from uuid import uuid4
+
+from app.core.lazy import ProcessLocal
+from app.services.supabase_service import get_supabase_service
+
+logger = logging.getLogger(__name__)
+
+# Delta event types pushed to session subscribers.
+CHAT_APPENDED = "chat.appended"
+IMAGE_EDITED = "image.edited"
+EDIT_HEAD_MOVED = "edit.head_moved"
+ASSET_ADDED = "asset.added"
+ASSET_UPDATED = "asset.updated"
+ASSET_DELETED = "asset.deleted"
+VIEW_CREATED = "view.created"
+VIEW_DELETED = "view.deleted"
+SESSION_DELETED = "session.deleted"
+# Sent instead of deltas when a subscriber cannot be resumed from its cursor.
+RESET = "reset"
+
+
+class _Subscriber:
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.closed = False
+
+    def close(self) -> None:
+        self.closed = True
+        if not self.queue.full():
+            self.queue.put_nowait(None)
+
+
+class _Channel:
+    def __init__(self, buffer_size: int):
+        self.seq = 0
+        self.buffer: Deque[Dict[str, Any]] = deque(maxlen=buffer_size)
+        self.subscribers: Set[_Subscriber] = set()
+
+
+class SessionEventBus:
+    """
+    Per-session stream of change deltas with resumable sequence numbers.
+
+    Every event carries a sequence number that increases by one per session.
+    Recent events are kept in a ring buffer so a reconnecting client can
+    resume from its last seen sequence. If the cursor is too old, or comes
+    from another process epoch, the client gets a single `reset` event and
+    should reload the session once.
+
+    Channels live in this worker's memory. Events published here are handed
+    to `relay` (see event_fanout.py), which forwards them to the other
+    workers; their events arrive through `publish_remote`.
+    """
+
+    def __init__(
+        self,
+        buffer_size: int = 256,
+        subscriber_queue_size: int = 256,
+        max_channels: int = 1024,
+    ):
+        self.epoch = uuid4().hex[:12]
+        self.buffer_size = buffer_size
+        self.subscriber_queue_size = subscriber_queue_size
+        self.max_channels = max_channels
+        self._channels: "OrderedDict[str, _Channel]" = OrderedDict()
+        self.relay: Optional[Callable[[str, str, Dict[str, Any]], None]] = None
+
+    def _channel(self, session_id: str) -> _Channel:
+        channel = self._channels.get(session_id)
+        if channel is None:
+            self._evict_idle_channels()
+            channel = self._channels[session_id] = _Channel(self.buffer_size)
+        else:
+            self._channels.move_to_end(session_id)
+        return channel
+
+    def _evict_idle_channels(self) -> None:
+        # Least recently used first; channels with live subscribers stay.
+        excess = len(self._channels) + 1 - self.max_channels
+        for session_id in list(self._channels):
+            if excess <= 0:
+                break
+            if not self._channels[session_id].subscribers:
+                del self._channels[session_id]
+                excess -= 1
+
+    def publish(self, session_id: str, event_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        event = self._publish(self._channel(session_id), session_id, event_type, data)
+        if self.relay is not None:
+            self.relay(session_id, event_type, data)
+        return event
+
+    def publish_remote(self, session_id: str, event_type: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Deliver an event published by another worker, if anyone here follows the session."""
+        channel = self._channels.get(session_id)
+        if channel is None:
+            return None
+        return self._publish(channel, session_id, event_type, data)
+
+    def reset_all(self) -> None:
+        """Tell every subscriber to reload, e.g. after missing remote events."""
+        for session_id, channel in list(self._channels.items()):
+            if channel.subscribers:
+                self._publish(channel, session_id, RESET, {})
+
+    def _publish(self, channel: _Channel, session_id: str, event_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        channel.seq += 1
+        event = {
+            "id": f"{self.epoch}:{channel.seq}",
+            "seq": channel.seq,
+            "type": event_type,
+            "session_id": session_id,
+            "data": data,
+            "ts": time.time(),
+        }
+        channel.buffer.append(event)
+        for subscriber in list(channel.subscribers):
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # A stalled subscriber must not hold up publishers; it is
+                # closed once drained and resumes from its cursor on reconnect.
+                channel.subscribers.discard(subscriber)
+                subscriber.close()
+        return event
+
+    def close_session(self, session_id: str) -> None:
+        channel = self._channels.pop(session_id, None)
+        if channel is None:
+            return
+        for subscriber in channel.subscribers:
+            subscriber.close()
+
+    def parse_cursor(self, cursor: Optional[str]) -> Tuple[Optional[str], Optional[int]]:
+        """Split an `epoch:seq` cursor (or a bare sequence number)."""
+        if not cursor:
+            return None, None
+        epoch, _, seq = cursor.rpartition(":")
+        try:
+            return (epoch or self.epoch), int(seq)
+        except ValueError:
+            return None, None
+
+    async def subscribe(
+        self,
+        session_id: str,
+        cursor: Optional[str] = None,
+        keepalive: float = 15.0,
+    ) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        Yield events after `cursor`, then live events as they are published.
+
+        Yields `None` every `keepalive` seconds without events so the caller
+        can send a heartbeat.
+        """
+        channel = self._channel(session_id)
+        subscriber = _Subscriber(self.subscriber_queue_size)
+        # Subscribe before replaying so nothing published meanwhile is missed;
+        # duplicates are dropped by sequence number below.
+        channel.subscribers.add(subscriber)
+        try:
+            epoch, since = self.parse_cursor(cursor)
+            last_seq = channel.seq
+            if since is not None:
+                oldest = channel.buffer[0]["seq"] if channel.buffer else channel.seq + 1
+                if epoch != self.epoch or since > channel.seq or since < oldest - 1:
+                    yield self._reset_event(session_id, channel)
+                else:
+                    replay = [event for event in channel.buffer if event["seq"] > since]
+                    last_seq = since
+                    for event in replay:
+                        last_seq = event["seq"]
+                        yield event
+
+            while True:
+                if subscriber.closed and subscriber.queue.empty():
+                    return
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if event is None:
+                    return
+                if event["seq"] <= last_seq:
+                    continue
+                last_seq = event["seq"]
+                yield event
+        finally:
+            channel.subscribers.discard(subscriber)
+
+    def _reset_event(self, session_id: str, channel: _Channel) -> Dict[str, Any]:
+        return {
+            "id": f"{self.epoch}:{channel.seq}",
+            "seq": channel.seq,
+            "type": RESET,
+            "session_id": session_id,
+            "data": {},
+            "ts": time.time(),
+        }
+
+
+_session_event_bus = ProcessLocal("session_event_bus", SessionEventBus)
+
+# Views never move between sessions, so the lookup is cached (LRU-bounded)
+# for the process; deleted views and sessions are dropped explicitly.
+VIEW_SESSION_CACHE_SIZE = 10000
+_view_sessions: "OrderedDict[str, str]" = OrderedDict()
+
+
+def get_session_event_bus() -> SessionEventBus:
+    return _session_event_bus.get()
+
+
+def publish_session_event(session_id: str, event_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    return get_session_event_bus().publish(session_id, event_type, data)
+
+
+def view_session_id(view_id: str) -> Optional[str]:
+    session_id = _view_sessions.get(view_id)
+    if session_id is not None:
+        _view_sessions.move_to_end(view_id)
+        return session_id
+    session_id = get_supabase_service().get_view_session_id(view_id)
+    if session_id is not None:
+        _view_sessions[view_id] = session_id
+        while len(_view_sessions) > VIEW_SESSION_CACHE_SIZE:
+            _view_sessions.popitem(last=False)
+    return session_id
+
+
+def forget_view(view_id: str) -> None:
+    _view_sessions.pop(view_id, None)
+
+
+def forget_session(session_id: str) -> None:
+    for view_id in [view_id for view_id, owner in _view_sessions.items() if owner == session_id]:
+        del _view_sessions[view_id]
+
+
+def publish_view_event(view_id: str, event_type: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Publish a delta for the session that owns `view_id`.
+
+    The mutation has already been committed, so a failed lookup is reported
+    and swallowed rather than turned into an error response.
+    """
+    try:
+        session_id = view_session_id(view_id)
+    except Exception as exc:
+        logger.warning("Error resolving session for view %s", view_id, extra={"error": str(exc)})
+        return None
+    if session_id is None:
+        return None
+    return publish_session_event(session_id, event_type, {"view_id": view_id, **data})
@@ -0,0 +1,177 @@
+import asyncio
+import io
+import json
+import re
+import zipfile
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Tuple
+from urllib.parse import urlparse
+
+from app.core.resilient_fetch import ResilientFetcher
+
+EXPORT_CHUNK_SIZE = 64 * 1024
+# Chunks buffered per in-flight download; bounds memory to
+# window * EXPORT_QUEUE_CHUNKS * EXPORT_CHUNK_SIZE regardless of session size.
+EXPORT_QUEUE_CHUNKS = 8
+
+_UNSAFE_NAME = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only, unseekable file that hands written bytes back to the caller."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _extension(url: str) -> str:
+    suffix = urlparse(url).path.rsplit("/", 1)[-1]
+    if "." in suffix:
+        ext = suffix.rsplit(".", 1)[-1].lower()
+        if ext.isalnum() and len(ext) <= 5:
+            return ext
+    return "jpg"
+
+
+def _describe(exc: Exception) -> str:
+    # Some exceptions (e.g. timeouts) have an empty message.
+    return f"{type(exc).__name__}: {exc}" if str(exc) else type(exc).__name__
+
+
+def _safe_name(name: str) -> str:
+    return _UNSAFE_NAME.sub("-", name).strip("-") or "asset"
+
+
+def build_export_plan(session: Dict[str, Any]) -> Tuple[List[Tuple[str, str]], Dict[str, Any]]:
+    """Map a session record to (archive name, url) entries and a manifest."""
+    entries: List[Tuple[str, str]] = []
+    manifest_views = []
+
+    for view_index, view in enumerate(session.get("views") or [], start=1):
+        prefix = f"view-{view_index:02d}"
+        view_manifest: Dict[str, Any] = {
+            "id": view.get("id"),
+            "original_image": None,
+            "edited_images": [],
+            "assets": [],
+            "chat_history": view.get("chat_history") or [],
+        }
+
+        original = view.get("original_image")
+        if original:
+            name = f"{prefix}/original.{_extension(original)}"
+            entries.append((name, original))
+            view_manifest["original_image"] = name
+
+        for edit_index, url in enumerate(view.get("edited_images") or [], start=1):
+            name = f"{prefix}/edit-{edit_index:02d}.{_extension(url)}"
+            entries.append((name, url))
+            view_manifest["edited_images"].append(name)
+
+        for asset in view.get("asset_library") or []:
+            url = asset.get("url")
+            if not url:
+                continue
+            name = f"{prefix}/assets/{_safe_name(asset.get('name') or '')}-{asset.get('id')}.{_extension(url)}"
+            entries.append((name, url))
+            view_manifest["assets"].append({"id": asset.get("id"), "name": asset.get("name"), "file": name})
+
+        manifest_views.append(view_manifest)
+
+    manifest = {
+        "session_id": session.get("id"),
+        "work_date": session.get("work_date"),
+        "exported_at": datetime.now(timezone.utc).isoformat(),
+        "views": manifest_views,
+    }
+    return entries, manifest
+
+
+async def _download(fetcher: ResilientFetcher, url: str, queue: asyncio.Queue) -> None:
+    """Stream `url` into `queue`; ends with None, or with the raised exception."""
+    try:
+        async with fetcher.stream(url) as response:
+            async for chunk in response.aiter_bytes(EXPORT_CHUNK_SIZE):
+                await queue.put(chunk)
+        await queue.put(None)
+    except Exception as exc:
+        await queue.put(exc)
+
+
+async def stream_session_zip(
+    session: Dict[str, Any],
+    *,
+    fetcher: ResilientFetcher,
+    window: int = 4,
+) -> AsyncIterator[bytes]:
+    """
+    Yield a ZIP archive of a session's images and a JSON manifest.
+
+    Up to `window` objects download concurrently while entries are written in
+    order, each chunk as it arrives, so the archive is never held in memory.
+    Objects that fail to download are listed under `errors` in the manifest.
+    """
+    entries, manifest = build_export_plan(session)
+    errors: List[Dict[str, str]] = []
+    sink = _ChunkSink()
+
+    queues = [asyncio.Queue(maxsize=EXPORT_QUEUE_CHUNKS) for _ in entries]
+    tasks: Dict[int, asyncio.Task] = {}
+
+    def start(index: int) -> None:
+        if index < len(entries):
+            tasks[index] = asyncio.create_task(_download(fetcher, entries[index][1], queues[index]))
+
+    try:
+        for index in range(window):
+            start(index)
+
+        with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as archive:
+            for index, (name, url) in enumerate(entries):
+                # Images are already compressed; store them as-is.
+                entry = zipfile.ZipInfo(name, date_time=datetime.now().timetuple()[:6])
+                entry.compress_type = zipfile.ZIP_STORED
+                item = await queues[index].get()
+                if isinstance(item, Exception):
+                    errors.append({"file": name, "url": url, "error": _describe(item)})
+                else:
+                    with archive.open(entry, mode="w") as handle:
+                        while item is not None:
+                            if isinstance(item, Exception):
+                                errors.append({"file": name, "url": url, "error": f"truncated: {_describe(item)}"})
+                                break
+                            handle.write(item)
+                            data = sink.drain()
+                            if data:
+                                yield data
+                            item = await queues[index].get()
+                tasks.pop(index, None)
+                start(index + window)
+                data = sink.drain()
+                if data:
+                    yield data
+
+            manifest["errors"] = errors
+            archive.writestr("manifest.json", json.dumps(manifest, indent=2, default=str))
+
+        yield sink.drain()
+    finally:
+        for task in tasks.values():
+            task.cancel()
@@ -1,38 +1,79 @@
+import logging
 from datetime import datetime, timezone
 from typing import Any, Dict, List, Optional
 from uuid import uuid4
 
 from supabase import Client, create_client
 
-from app.core.config import settings
+from app.core.config import Settings, get_settings, require_setting
+from app.core.lazy import ProcessLocal
+
+logger = logging.getLogger(__name__)
+
+SESSION_COLUMNS = (
+    "id, work_date, views(id, original_image, edited_images, edit_head, chat_history, asset_library(id, name, url))"
+)
+SESSION_VERSION_COLUMNS = (
+    "id, updated_at, views(id, updated_at, asset_library(id, updated_at))"
+)
+
+
+def _normalize_versions(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Sort embedded rows so the version data does not depend on join order."""
+    views = sorted(row.get("views") or [], key=lambda view: view["id"])
+    return {
+        "id": row["id"],
+        "updated_at": row.get("updated_at"),
+        "views": [
+            {
+                "id": view["id"],
+                "updated_at": view.get("updated_at"),
+                "assets": sorted(
+                    (asset["id"], asset.get("updated_at"))
+                    for asset in (view.get("asset_library") or [])
+                ),
+            }
+            for view in views
+        ],
+    }
+
 
 class SupabaseService:
-    def __init__(self):
-        self.url: str = settings.SUPABASE_URL
-        self.key: str = settings.SUPABASE_KEY
+    def __init__(self, settings: Settings):
+        self.url: str = require_setting(settings, "SUPABASE_URL")
+        self.key: str = require_setting(settings, "SUPABASE_KEY")
         self.client: Client = create_client(self.url, self.key)
         self.bucket_name = "images"  # Replace with your actual bucket name
 
+    def warmup(self) -> None:
+        """Open pooled connections to PostgREST and Storage with cheap requests."""
+        self.client.table("sessions").select("id").limit(1).execute()
+        self.client.storage.from_(self.bucket_name).list(options={"limit": 1})
+
     def upload_image(
         self,
         file_content: bytes,
         file_name: str,
         content_type: str = "image/png",
         folder: Optional[str] = None,
+        upsert: bool = False,
     ) -> str:
         """
         Uploads a file to Supabase Storage.
         """
         try:
             storage_path = f"{folder.rstrip('/')}/{file_name}" if folder else file_name
+            file_options = {"content-type": content_type}
+            if upsert:
+                file_options["upsert"] = "true"
             self.client.storage.from_(self.bucket_name).upload(
                 path=storage_path,
                 file=file_content,
-                file_options={"content-type": content_type},
+                file_options=file_options,
             )
             return storage_path
         except Exception as e:
-            print(f"Error uploading to Supabase: {str(e)}")
+            logger.warning("Error uploading %s to Supabase", storage_path, extra={"error": str(e)})
             raise e
 
     def get_public_url(self, file_name: str):
@@ -62,15 +103,46 @@ class SupabaseService:
             return data["id"]
         raise RuntimeError("Failed to create session: missing id in Supabase response")
 
+    def create_session_with_views(self, session_id: str, views: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Insert a session and all of its views in one transaction.
+
+        `session_id` is generated by the caller so images can be stored under
+        it before the rows exist. Returns the inserted views in input order.
+        """
+        response = self.client.rpc(
+            "create_session_with_views",
+            {
+                "p_session_id": session_id,
+                "p_work_date": datetime.now(timezone.utc).isoformat(),
+                "p_views": [
+                    {
+                        "original_image": view.get("original_image"),
+                        "edited_images": view.get("edited_images", []),
+                        "chat_history": view.get("chat_history", []),
+                    }
+                    for view in views
+                ],
+            },
+        ).execute()
+        return response.data or []
+
     def create_views(self, session_id: str, views: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         payload = []
         for view in views:
+            edited_images = view.get("edited_images", [])
             payload.append(
                 {
                     "session_id": session_id,
                     "original_image": view.get("original_image"),
                     "chat_history": view.get("chat_history", []),
-                    "edited_images": view.get("edited_images", []),
+                    "edited_images": edited_images,
+                    # Seeded edits form a single branch ending at the last one.
+                    "edit_history": [
+                        {"url": url, "parent": index - 1}
+                        for index, url in enumerate(edited_images)
+                    ],
+                    "edit_head": len(edited_images) - 1,
                 }
             )
 
@@ -84,6 +156,17 @@ class SupabaseService:
         )
         return response.data or []
 
+    def get_view_session_id(self, view_id: str) -> Optional[str]:
+        response = (
+            self.client.table("views")
+            .select("session_id")
+            .eq("id", view_id)
+            .limit(1)
+            .execute()
+        )
+        data = response.data or []
+        return data[0]["session_id"] if data else None
+
     def _fetch_chat_history(self, view_id: str) -> List[Dict[str, Any]]:
         response = (
             self.client.table("views")
@@ -105,55 +188,34 @@ class SupabaseService:
         )
         return history
 
-    def remove_latest_chat_entry(self, view_id: str) -> List[Dict[str, Any]]:
-        history = self._fetch_chat_history(view_id)
-        if not history:
-            return history
+    # Edit history ---------------------------------------------------------
+    #
+    # Views keep every edited image in `edit_history` with a movable
+    # `edit_head`; see supabase/migrations/*_view_edit_history.sql. Each
+    # operation below is one RPC round-trip that returns the updated row.
 
-        history = history[:-1]
-        (
-            self.client.table("views")
-            .update({"chat_history": history})
-            .eq("id", view_id)
-            .execute()
-        )
-        return history
-
-    def _fetch_edited_images(self, view_id: str) -> List[str]:
-        response = (
-            self.client.table("views")
-            .select("edited_images")
-            .eq("id", view_id)
-            .single()
-            .execute()
-        )
-        data = response.data.get("edited_images") or []
+    def _edit_rpc(self, function: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        response = self.client.rpc(function, params).execute()
+        data = response.data
+        if isinstance(data, list):
+            data = data[0] if data else None
+        if not data:
+            raise ValueError("View not found")
         return data
 
-    def append_edited_image(self, view_id: str, image_url: str) -> List[str]:
-        images = self._fetch_edited_images(view_id)
-        images.append(image_url)
-        (
-            self.client.table("views")
-            .update({"edited_images": images})
-            .eq("id", view_id)
-            .execute()
-        )
-        return images
+    def push_edit(self, view_id: str, image_url: str) -> Dict[str, Any]:
+        """Add `image_url` as the new head; idempotent for an existing URL."""
+        return self._edit_rpc("view_push_edit", {"p_view_id": view_id, "p_url": image_url})
 
-    def remove_latest_edited_image(self, view_id: str) -> List[str]:
-        images = self._fetch_edited_images(view_id)
-        if not images:
-            return images
+    def undo_edit(self, view_id: str) -> Dict[str, Any]:
+        return self._edit_rpc("view_undo_edit", {"p_view_id": view_id})
 
-        images = images[:-1]
-        (
-            self.client.table("views")
-            .update({"edited_images": images})
-            .eq("id", view_id)
-            .execute()
-        )
-        return images
+    def redo_edit(self, view_id: str) -> Dict[str, Any]:
+        return self._edit_rpc("view_redo_edit", {"p_view_id": view_id})
+
+    def checkout_edit(self, view_id: str, index: int) -> Dict[str, Any]:
+        """Move the head to edit `index` (-1 = original) to branch from it."""
+        return self._edit_rpc("view_checkout_edit", {"p_view_id": view_id, "p_index": index})
 
     def insert_asset_record(self, view_id: str, name: str, url: str) -> Dict[str, Any]:
         response = (
@@ -205,65 +267,62 @@ class SupabaseService:
             .execute()
         )
 
+    # Views and assets are removed by cascading foreign keys; see
+    # supabase/migrations/*_session_cascade.sql.
+
     def delete_view(self, view_id: str) -> None:
-        self.client.table("asset_library").delete().eq("view_id", view_id).execute()
-        (
-            self.client.table("views")
-            .delete()
-            .eq("id", view_id)
-            .execute()
-        )
+        self.client.table("views").delete().eq("id", view_id).execute()
 
     def delete_session(self, session_id: str) -> None:
-        session_response = (
+        response = self.client.table("sessions").delete().eq("id", session_id).execute()
+        if not response.data:
+            raise ValueError("Session not found")
+
+    def list_sessions(self, limit: int = 10) -> List[Dict[str, Any]]:
+        response = (
             self.client.table("sessions")
-            .select("id")
-            .eq("id", session_id)
+            .select(SESSION_COLUMNS)
+            .order("work_date", desc=True)
+            .limit(limit)
             .execute()
         )
-        session_records = session_response.data or []
-        if not session_records:
-            raise ValueError("Session not found")
+        return response.data or []
 
-        views_response = (
-            self.client.table("views")
-            .select("id")
-            .eq("session_id", session_id)
+    def list_session_versions(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Ids and update times only; cheap input for a list ETag."""
+        response = (
+            self.client.table("sessions")
+            .select(SESSION_VERSION_COLUMNS)
+            .order("work_date", desc=True)
+            .limit(limit)
             .execute()
         )
-        view_ids = [item["id"] for item in (views_response.data or [])]
-
-        if view_ids:
-            (
-                self.client.table("asset_library")
-                .delete()
-                .in_("view_id", view_ids)
-                .execute()
-            )
-            (
-                self.client.table("views")
-                .delete()
-                .in_("id", view_ids)
-                .execute()
-            )
+        return [_normalize_versions(row) for row in (response.data or [])]
 
-        (
+    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        response = (
             self.client.table("sessions")
-            .delete()
+            .select(SESSION_COLUMNS)
             .eq("id", session_id)
+            .limit(1)
             .execute()
         )
+        data = response.data or []
+        return data[0] if data else None
 
-    def list_sessions(self, limit: int = 10) -> List[Dict[str, Any]]:
+    def get_session_version(self, session_id: str) -> Optional[Dict[str, Any]]:
         response = (
             self.client.table("sessions")
-            .select(
-                "id, work_date, views(id, original_image, edited_images, chat_history, asset_library(id, name, url))"
-            )
-            .order("work_date", desc=True)
-            .limit(limit)
+            .select(SESSION_VERSION_COLUMNS)
+            .eq("id", session_id)
+            .limit(1)
             .execute()
         )
-        return response.data or []
+        data = response.data or []
+        return _normalize_versions(data[0]) if data else None
+
+_supabase_service = ProcessLocal("supabase_service", lambda: SupabaseService(get_settings()))
+
 
-supabase_service = SupabaseService()
+def get_supabase_service() -> SupabaseService:
+    return _supabase_service.get()
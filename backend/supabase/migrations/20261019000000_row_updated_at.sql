@@ -0,0 +1,31 @@
+-- Track row modification times so the API can derive cheap version tags
+-- (ETags) for sessions and their views without loading full payloads.
+
+create or replace function public.set_updated_at()
+returns trigger
+language plpgsql
+as $$
+begin
+  new.updated_at = now();
+  return new;
+end;
+$$;
+
+alter table public.sessions add column if not exists updated_at timestamptz not null default now();
+alter table public.views add column if not exists updated_at timestamptz not null default now();
+alter table public.asset_library add column if not exists updated_at timestamptz not null default now();
+
+drop trigger if exists sessions_set_updated_at on public.sessions;
+create trigger sessions_set_updated_at
+  before update on public.sessions
+  for each row execute function public.set_updated_at();
+
+drop trigger if exists views_set_updated_at on public.views;
+create trigger views_set_updated_at
+  before update on public.views
+  for each row execute function public.set_updated_at();
+
+drop trigger if exists asset_library_set_updated_at on public.asset_library;
+create trigger asset_library_set_updated_at
+  before update on public.asset_library
+  for each row execute function public.set_updated_at();
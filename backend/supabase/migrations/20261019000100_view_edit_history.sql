@@ -0,0 +1,141 @@
+-- Version-pointer edit history for views.
+--
+-- `edit_history` keeps every edited image ever produced for a view as nodes
+-- `{url, parent}`, where `parent` is the index of the node it was derived
+-- from (-1 = the original image). `edit_head` points at the current node and
+-- `edit_redo` is a stack of node indexes that were undone. `edited_images`
+-- (jsonb array) stays the materialized path from the original to the head,
+-- which is what clients render.
+--
+-- Undo/redo only move the pointer, so undone images are never regenerated
+-- and stay in storage until they are garbage collected.
+
+alter table public.views add column if not exists edit_history jsonb not null default '[]'::jsonb;
+alter table public.views add column if not exists edit_head integer not null default -1;
+alter table public.views add column if not exists edit_redo jsonb not null default '[]'::jsonb;
+
+-- Existing linear histories become a single branch ending at the last edit.
+update public.views
+set
+  edit_history = (
+    select jsonb_agg(jsonb_build_object('url', e.value, 'parent', e.ord - 2) order by e.ord)
+    from jsonb_array_elements(edited_images) with ordinality as e(value, ord)
+  ),
+  edit_head = jsonb_array_length(edited_images) - 1
+where edit_history = '[]'::jsonb
+  and jsonb_array_length(coalesce(edited_images, '[]'::jsonb)) > 0;
+
+
+create or replace function public.view_push_edit(p_view_id uuid, p_url text)
+returns jsonb
+language plpgsql
+as $$
+declare
+  v public.views;
+begin
+  -- Idempotent: a URL already in the history is not added twice.
+  update public.views
+  set
+    edit_history = edit_history || jsonb_build_array(jsonb_build_object('url', p_url, 'parent', edit_head)),
+    edit_head = jsonb_array_length(edit_history),
+    edit_redo = '[]'::jsonb,
+    edited_images = coalesce(edited_images, '[]'::jsonb) || to_jsonb(p_url)
+  where id = p_view_id
+    and not edit_history @> jsonb_build_array(jsonb_build_object('url', p_url))
+  returning * into v;
+
+  if not found then
+    select * into v from public.views where id = p_view_id;
+    if not found then
+      raise exception 'View not found' using errcode = 'P0002';
+    end if;
+  end if;
+  return to_jsonb(v);
+end;
+$$;
+
+
+create or replace function public.view_undo_edit(p_view_id uuid)
+returns jsonb
+language plpgsql
+as $$
+declare
+  v public.views;
+begin
+  update public.views
+  set
+    edit_head = coalesce((edit_history -> edit_head ->> 'parent')::integer, -1),
+    edit_redo = edit_redo || to_jsonb(edit_head),
+    edited_images = edited_images - (-1)
+  where id = p_view_id and edit_head >= 0
+  returning * into v;
+
+  if not found then
+    select * into v from public.views where id = p_view_id;
+    if not found then
+      raise exception 'View not found' using errcode = 'P0002';
+    end if;
+  end if;
+  return to_jsonb(v);
+end;
+$$;
+
+
+create or replace function public.view_redo_edit(p_view_id uuid)
+returns jsonb
+language plpgsql
+as $$
+declare
+  v public.views;
+begin
+  update public.views
+  set
+    edit_head = (edit_redo ->> -1)::integer,
+    edit_redo = edit_redo - (-1),
+    edited_images = edited_images || (edit_history -> ((edit_redo ->> -1)::integer) -> 'url')
+  where id = p_view_id and jsonb_array_length(edit_redo) > 0
+  returning * into v;
+
+  if not found then
+    select * into v from public.views where id = p_view_id;
+    if not found then
+      raise exception 'View not found' using errcode = 'P0002';
+    end if;
+  end if;
+  return to_jsonb(v);
+end;
+$$;
+
+
+-- Move the head to any node (-1 = original) so new edits branch from it.
+create or replace function public.view_checkout_edit(p_view_id uuid, p_index integer)
+returns jsonb
+language plpgsql
+as $$
+declare
+  v public.views;
+  history jsonb;
+  node integer;
+  path jsonb := '[]'::jsonb;
+begin
+  select edit_history into history from public.views where id = p_view_id for update;
+  if not found then
+    raise exception 'View not found' using errcode = 'P0002';
+  end if;
+  if p_index < -1 or p_index >= jsonb_array_length(history) then
+    raise exception 'Edit index out of range' using errcode = '22023';
+  end if;
+
+  node := p_index;
+  while node >= 0 loop
+    path := jsonb_build_array(history -> node -> 'url') || path;
+    node := (history -> node ->> 'parent')::integer;
+  end loop;
+
+  update public.views
+  set edit_head = p_index, edit_redo = '[]'::jsonb, edited_images = path
+  where id = p_view_id
+  returning * into v;
+  return to_jsonb(v);
+end;
+$$;
@@ -0,0 +1,100 @@
+-- Set-based session lifecycle.
+--
+-- Deleting a session or view cascades to its children in the database, so a
+-- teardown is a single DELETE regardless of how many views or assets exist.
+-- `create_session_with_views` inserts a session and all of its views in one
+-- call (and one transaction), so a failed insert never leaves a session
+-- without its views behind.
+
+-- Replace whatever foreign keys exist on the parent columns with cascading
+-- ones. They are added `not valid` so rows orphaned by the old
+-- multi-request deletes do not block the migration.
+do $$
+declare
+  c record;
+begin
+  for c in
+    select con.conname, con.conrelid::regclass as tbl
+    from pg_constraint con
+    join pg_attribute att on att.attrelid = con.conrelid and att.attnum = any (con.conkey)
+    where con.contype = 'f'
+      and (
+        (con.conrelid = 'public.views'::regclass and att.attname = 'session_id')
+        or (con.conrelid = 'public.asset_library'::regclass and att.attname = 'view_id')
+      )
+  loop
+    execute format('alter table %s drop constraint %I', c.tbl, c.conname);
+  end loop;
+end;
+$$;
+
+alter table public.views
+  add constraint views_session_id_fkey
+  foreign key (session_id) references public.sessions (id) on delete cascade
+  not valid;
+
+alter table public.asset_library
+  add constraint asset_library_view_id_fkey
+  foreign key (view_id) references public.views (id) on delete cascade
+  not valid;
+
+-- Cascades look children up by parent id.
+create index if not exists views_session_id_idx on public.views (session_id);
+create index if not exists asset_library_view_id_idx on public.asset_library (view_id);
+
+
+-- `p_views` is a JSON array of {original_image, edited_images, chat_history};
+-- seeded edits form a single branch ending at the last one. Returns the
+-- inserted view rows in input order.
+create or replace function public.create_session_with_views(
+  p_session_id uuid,
+  p_work_date timestamptz,
+  p_views jsonb
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+  result jsonb;
+begin
+  insert into public.sessions (id, work_date)
+  values (p_session_id, coalesce(p_work_date, now()));
+
+  -- Ids are drawn up front (materialized once) so the result can be ordered
+  -- like the input.
+  with source as materialized (
+    select
+      gen_random_uuid() as id,
+      v.ord,
+      v.value ->> 'original_image' as original_image,
+      coalesce(v.value -> 'edited_images', '[]'::jsonb) as edited_images,
+      coalesce(v.value -> 'chat_history', '[]'::jsonb) as chat_history
+    from jsonb_array_elements(coalesce(p_views, '[]'::jsonb)) with ordinality as v(value, ord)
+  ),
+  inserted as (
+    insert into public.views (id, session_id, original_image, edited_images, chat_history, edit_history, edit_head)
+    select
+      s.id,
+      p_session_id,
+      s.original_image,
+      s.edited_images,
+      s.chat_history,
+      coalesce(
+        (
+          select jsonb_agg(jsonb_build_object('url', e.value, 'parent', e.ord - 2) order by e.ord)
+          from jsonb_array_elements(s.edited_images) with ordinality as e(value, ord)
+        ),
+        '[]'::jsonb
+      ),
+      jsonb_array_length(s.edited_images) - 1
+    from source s
+    returning *
+  )
+  select coalesce(jsonb_agg(to_jsonb(i) order by s.ord), '[]'::jsonb)
+  into result
+  from inserted i
+  join source s on s.id = i.id;
+
+  return result;
+end;
+$$;